@@ -36,9 +36,39 @@ def create_app(config_class='config.Config'):
     app.register_blueprint(main_bp)
     app.register_blueprint(oauth_verify_bp)
     
+    from app.commands import register_commands
+    register_commands(app)
+    
+    from app.weather import configure_weather_cache
+    configure_weather_cache(app)
+    
+    from app.email import mail_dispatcher
+    mail_dispatcher.init_app(app)
+    
+    from app.stats import admin_stats
+    admin_stats.init_app(app)
+    
+    from app.user_cache import user_cache
+    user_cache.init_app(app)
+    
+    from app.passwords import password_hasher
+    password_hasher.init_app(app)
+    
+    from app import chatbot
+    chatbot.init_app(app)
+    
+    from app.page_cache import page_cache
+    page_cache.init_app(app)
+    
+    from app.live import live_hub
+    live_hub.init_app(app)
+    
+    from app.geo import zip_centroids
+    zip_centroids.init_app(app)
+    
     return app
 
-from app.models import User
+from app.user_cache import user_cache
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -47,8 +77,7 @@ def load_user(user_id):
             return None
         
         user_id_int = int(user_id)
-        user = User.query.get(user_id_int)
-        return user
+        return user_cache.get(user_id_int)
         
     except (ValueError, TypeError):
         return None
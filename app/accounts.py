@@ -0,0 +1,64 @@
+import threading
+import time
+from flask import current_app
+from app import db
+from app.models import User, Event, EventSeries, EventVolunteer, PasswordResetToken, IdempotencyKey
+from app.page_cache import page_cache
+from app.stats import admin_stats
+from app.user_cache import user_cache
+
+
+def delete_user_account(user_id):
+    """Delete a user and everything that hangs off them with ordered set-based statements.
+    
+    Runs in one transaction and returns rows removed per table plus elapsed seconds.
+    """
+    started = time.perf_counter()
+    organized = db.select(Event.id).where(Event.organizer_id == user_id)
+    
+    def run(statement):
+        return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+    
+    # Give spots back on other organizers' events before the signups disappear
+    Event.release_spots(
+        db.select(EventVolunteer.event_id).where(
+            EventVolunteer.volunteer_id == user_id,
+            EventVolunteer.event_id.not_in(organized)
+        )
+    )
+    removed = {
+        'event_volunteers': run(db.delete(EventVolunteer).where(db.or_(
+            EventVolunteer.volunteer_id == user_id,
+            EventVolunteer.event_id.in_(organized)
+        ))),
+        'events': run(db.delete(Event).where(Event.organizer_id == user_id)),
+        'event_series': run(db.delete(EventSeries).where(EventSeries.organizer_id == user_id)),
+        'password_reset_tokens': run(db.delete(PasswordResetToken).where(PasswordResetToken.user_id == user_id)),
+        'idempotency_keys': run(db.delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id)),
+        'users': run(db.delete(User).where(User.id == user_id)),
+    }
+    db.session.commit()
+    db.session.expire_all()
+    
+    return {'removed': removed, 'elapsed_seconds': round(time.perf_counter() - started, 3)}
+
+
+def delete_user_account_in_background(user_id):
+    """Run delete_user_account on a worker thread for accounts too large to delete inside a request"""
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            try:
+                report = delete_user_account(user_id)
+                user_cache.invalidate(user_id)
+                page_cache.invalidate_all()
+                admin_stats.invalidate()
+                app.logger.info('Deleted user %s: %s', user_id, report)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Background deletion of user %s failed', user_id)
+    
+    thread = threading.Thread(target=run, name=f'delete-user-{user_id}', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,143 @@
+from app import db
+from app.models import User, Event, EventVolunteer
+from app.stats import admin_stats
+
+ADMIN_PAGE_SIZE = 25
+ADMIN_MAX_PAGE_SIZE = 100
+
+
+def prefix_match(column, prefix):
+    """Case-insensitive prefix filter that an index on lower(column) can serve.
+    
+    The range bounds drive the index scan and the LIKE handles escaping. The bounds only hold under
+    a bytewise collation, so Postgres compares in "C" against its *_lower_c indexes; SQLite's default
+    BINARY collation already is one.
+    """
+    prefix = prefix.lower()
+    lowered = db.func.lower(column)
+    if db.engine.dialect.name == 'postgresql':
+        lowered = lowered.collate('C')
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return db.and_(lowered >= prefix, lowered < upper, lowered.like(escaped + '%', escape='\\'))
+
+
+class AdminTable:
+    """Server-side paging, sorting and prefix search over one model.
+    
+    Every sort key and search column is backed by an index.
+    """
+    
+    def __init__(self, query, sorts, default_sort, search_columns, total_key):
+        self.query = query
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.search_columns = search_columns
+        self.total_key = total_key
+    
+    def params(self, args):
+        """Validated (page, per_page, sort, direction, q) from request args; raises ValueError"""
+        sort = args.get('sort', self.default_sort)
+        if sort not in self.sorts:
+            raise ValueError(f'Unknown sort: {sort}')
+        direction = args.get('direction', 'asc')
+        if direction not in ('asc', 'desc'):
+            raise ValueError('direction must be asc or desc')
+        
+        page = max(args.get('page', 1, type=int), 1)
+        per_page = min(max(args.get('per_page', ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+        return {'page': page, 'per_page': per_page, 'sort': sort, 'direction': direction,
+                'q': args.get('q', '').strip()}
+    
+    def page(self, params):
+        query = self.query()
+        if params['q']:
+            query = query.filter(db.or_(*(prefix_match(column, params['q']) for column in self.search_columns)))
+        
+        order = [self.sorts[params['sort']]]
+        if params['sort'] != 'id':
+            order.append(self.sorts['id'])
+        query = query.order_by(*(column.desc() if params['direction'] == 'desc' else column.asc() for column in order))
+        
+        # Unfiltered totals come from the cached admin stats instead of a COUNT over the whole table
+        if params['q']:
+            return query.paginate(page=params['page'], per_page=params['per_page'], error_out=False)
+        pagination = query.paginate(page=params['page'], per_page=params['per_page'], error_out=False, count=False)
+        pagination.total = admin_stats.get()[self.total_key]
+        return pagination
+
+
+user_table = AdminTable(
+    query=lambda: User.query,
+    sorts={
+        'id': User.id,
+        'username': db.func.lower(User.username),
+        'email': db.func.lower(User.email),
+        'created_at': User.created_at,
+    },
+    default_sort='id',
+    search_columns=(User.username, User.email),
+    total_key='total_users',
+)
+
+event_table = AdminTable(
+    query=Event.listing_query,
+    sorts={
+        'id': Event.id,
+        'title': db.func.lower(Event.title),
+        'date': Event.date,
+    },
+    default_sort='date',
+    search_columns=(Event.title,),
+    total_key='total_events',
+)
+
+
+def user_activity(user_ids):
+    """{user_id: (events created, volunteer signups)} for one page of users"""
+    created = dict(db.session.execute(
+        db.select(Event.organizer_id, db.func.count(Event.id))
+        .where(Event.organizer_id.in_(user_ids)).group_by(Event.organizer_id)
+    ).all())
+    signups = dict(db.session.execute(
+        db.select(EventVolunteer.volunteer_id, db.func.count(EventVolunteer.id))
+        .where(EventVolunteer.volunteer_id.in_(user_ids)).group_by(EventVolunteer.volunteer_id)
+    ).all())
+    return {user_id: (created.get(user_id, 0), signups.get(user_id, 0)) for user_id in user_ids}
+
+
+def user_row(user, activity):
+    events_created, volunteer_signups = activity
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'user_type': user.user_type,
+        'is_admin': bool(user.is_admin),
+        'created_at': user.created_at.isoformat() if user.created_at else None,
+        'events_created': events_created,
+        'volunteer_signups': volunteer_signups,
+    }
+
+
+def event_row(event):
+    return {
+        'id': event.id,
+        'title': event.title,
+        'organizer': event.organizer.username,
+        'date': event.date.isoformat(),
+        'city': event.city,
+        'state': event.state,
+        'volunteers_count': event.volunteers_count(),
+        'max_volunteers': event.max_volunteers,
+    }
+
+
+def page_meta(pagination):
+    return {
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'next_page': pagination.next_num,
+    }
@@ -7,7 +7,10 @@ from app.oauth import GoogleOAuth
 from app.email import send_password_reset_email
 import secrets
 from urllib.parse import urlencode
-from app.models import User, PasswordResetToken
+from app.models import User
+from app.user_cache import user_cache
+from app.passwords import HasherBusy
+from app.page_cache import page_cache
 
 auth = Blueprint('auth', __name__)
 
@@ -20,7 +23,13 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         
-        if user and user.check_password(form.password.data):
+        try:
+            authenticated = user is not None and user.check_password(form.password.data)
+        except HasherBusy:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('login.html', form=form), 503
+        
+        if authenticated:
             login_user(user, remember=form.remember.data)
             flash('Login successful!', 'success')
             
@@ -78,25 +87,22 @@ def reset_password(token):
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     
-    user = User.verify_password_reset_token(token)
-    if not user:
-        flash('The password reset link is invalid or has expired.', 'error')
-        return redirect(url_for('auth.forgot_password'))
-    
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        user.set_password(form.password.data)
-        
-        reset_token = PasswordResetToken.query.filter_by(token=token).first()
-        if reset_token:
-            reset_token.mark_as_used()
-        
-        db.session.commit()
-        
-        flash('Your password has been reset! You can now login with your new password.', 'success')
-        return redirect(url_for('auth.login'))
+        # Checking and consuming the token is one statement, so a link works exactly once
+        user = User.consume_password_reset_token(token)
+        if user:
+            user.set_password(form.password.data)
+            db.session.commit()
+            
+            flash('Your password has been reset! You can now login with your new password.', 'success')
+            return redirect(url_for('auth.login'))
+    elif User.verify_password_reset_token(token):
+        return render_template('reset_password.html', form=form, token=token)
     
-    return render_template('reset_password.html', form=form, token=token)
+    db.session.rollback()
+    flash('The password reset link is invalid or has expired.', 'error')
+    return redirect(url_for('auth.forgot_password'))
 
 @auth.route('/profile/change-username', methods=['GET', 'POST'])
 @login_required
@@ -109,11 +115,16 @@ def change_username():
             flash('Username already taken. Please choose another.', 'error')
             return render_template('change_username.html', form=form)
         
-        old_username = current_user.username
-        current_user.username = form.new_username.data
+        user = db.session.get(User, current_user.id)
+        old_username = user.username
+        user.username = form.new_username.data
+        # Listings and event pages show the organizer's name and are validated on event timestamps
+        user.touch_organized()
         db.session.commit()
+        user_cache.invalidate(user.id)
+        page_cache.invalidate_all()
         
-        flash(f'Username changed from {old_username} to {current_user.username}', 'success')
+        flash(f'Username changed from {old_username} to {user.username}', 'success')
         return redirect(url_for('main.dashboard'))
     
     return render_template('change_username.html', form=form)
@@ -124,11 +135,17 @@ def change_password():
     form = ChangePasswordForm()
     
     if form.validate_on_submit():
-        if not current_user.check_password(form.current_password.data):
+        user = db.session.get(User, current_user.id)
+        try:
+            correct = user.check_password(form.current_password.data)
+        except HasherBusy:
+            flash('We could not check your password right now. Please try again in a moment.', 'warning')
+            return render_template('change_password.html', form=form), 503
+        if not correct:
             flash('Current password is incorrect.', 'error')
             return render_template('change_password.html', form=form)
         
-        current_user.set_password(form.new_password.data)
+        user.set_password(form.new_password.data)
         db.session.commit()
         
         flash('Your password has been changed successfully!', 'success')
@@ -168,11 +185,11 @@ def google_login():
         
         auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
         return redirect(auth_url)
-        
+    
     except Exception:
         flash('Failed to connect to Google. Please try again.', 'error')
         return redirect(url_for('auth.login'))
-    
+
 @auth.route('/auth/google/callback')
 def google_callback():
     code = request.args.get('code')
@@ -203,7 +220,7 @@ def google_callback():
         flash(f'Welcome, {welcome_name}!', 'success')
         
         return redirect(url_for('main.dashboard'))
-        
+    
     except Exception:
         flash('Failed to login with Google. Please try again.', 'error')
         return redirect(url_for('auth.login'))
\ No newline at end of file
@@ -0,0 +1,98 @@
+import json
+import os
+from collections import deque
+
+DEFAULT_INTENTS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'chatbot_intents.json')
+
+
+class IntentMatcher:
+    """Aho-Corasick automaton over every intent keyword.
+    
+    Intents are listed in priority order; a message gets the response of the
+    first intent with any keyword occurring in it, found in one pass over the
+    message regardless of how many intents there are.
+    """
+    
+    def __init__(self, intents=(), fallback=''):
+        self.build(intents, fallback)
+    
+    def build(self, intents, fallback):
+        self.fallback = fallback
+        self.responses = [intent['response'] for intent in intents]
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+        
+        for priority, intent in enumerate(intents):
+            for keyword in intent['keywords']:
+                self._add(keyword.lower(), priority)
+        self._link()
+    
+    def load(self, path):
+        with open(path) as f:
+            table = json.load(f)
+        self.build(table['intents'], table['fallback'])
+    
+    def _add(self, keyword, priority):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        if self._best[state] is None or priority < self._best[state]:
+            self._best[state] = priority
+    
+    def _link(self):
+        # Breadth-first so each state's failure target is finished before its children
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if child == self._fail[child]:
+                    self._fail[child] = 0
+                
+                # Fold in keywords that end here as suffixes of this state's path
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+    
+    def match(self, message):
+        """Priority of the best matching intent, or None"""
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = None
+        for char in message.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            priority = best[state]
+            if priority is not None and (found is None or priority < found):
+                found = priority
+                if found == 0:
+                    break
+        return found
+    
+    def respond(self, message):
+        priority = self.match(message)
+        return self.fallback if priority is None else self.responses[priority]
+
+
+intent_matcher = IntentMatcher()
+
+
+def init_app(app):
+    intent_matcher.load(app.config.get('CHATBOT_INTENTS_PATH') or DEFAULT_INTENTS_PATH)
+
+
+def generate_chatbot_response(message):
+    return intent_matcher.respond(message)
@@ -0,0 +1,394 @@
+import click
+import csv
+import os
+import random
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, text
+from app import db
+from app.models import User, Event, EventVolunteer, PasswordResetToken, IdempotencyKey
+from app.accounts import delete_user_account
+from app.passwords import PasswordHasher, HASHERS
+from app.chatbot import IntentMatcher
+from app.admin_tables import prefix_match
+from app.search import event_search
+from app.geo import zip_centroids, grid_cell, normalize_zip, CentroidsMissing
+from app.imports import import_events as run_import, import_format, IMPORT_CHUNK_SIZE
+from app.email import mail_dispatcher
+from app.reminders import (dispatch_reminders, REMINDER_BATCH_SIZE, REMINDER_WINDOW_HOURS,
+                           REMINDER_CLAIM_TIMEOUT_MINUTES)
+
+# Columns added after the initial schema, as (table, column, DDL)
+ADDED_COLUMNS = [
+    ('events', 'signup_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('events', 'updated_at', 'TIMESTAMP'),
+    ('events', 'latitude', 'FLOAT'),
+    ('events', 'longitude', 'FLOAT'),
+    ('events', 'geo_cell', 'INTEGER'),
+    ('events', 'series_id', 'INTEGER REFERENCES event_series(id)'),
+    ('users', 'calendar_token', 'VARCHAR(64)'),
+    ('event_volunteers', 'reminder_sent_at', 'TIMESTAMP'),
+    ('event_volunteers', 'reminder_claimed_at', 'TIMESTAMP'),
+]
+
+
+def add_missing_columns():
+    inspector = inspect(db.engine)
+    added = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if column not in {c['name'] for c in inspector.get_columns(table)}:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            added.append(f'{table}.{column}')
+    db.session.commit()
+    return added
+
+
+def existing_index_names(inspector, table):
+    if db.engine.dialect.name == 'sqlite':
+        # SQLAlchemy cannot reflect expression indexes on SQLite, so read the names directly
+        return set(db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"), {'table': table}
+        ).scalars())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def create_missing_indexes():
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = existing_index_names(inspector, table.name)
+        for index in table.indexes:
+            if index.info.get('dialect', db.engine.dialect.name) != db.engine.dialect.name:
+                continue
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def listing_query_plans():
+    """The hot listing queries paired with the index each one is expected to use"""
+    now = datetime.utcnow()
+    return [
+        ('upcoming events', 'ix_events_date_id',
+         Event.listing_query().filter(Event.date >= now).order_by(Event.date.asc()).statement),
+        ('events api page', 'ix_events_date_id',
+         Event.api_select(Event.API_FIELDS).where(Event.date >= now).limit(50)),
+        ('organizer dashboard', 'ix_events_organizer_id_date',
+         Event.listing_query().filter_by(organizer_id=1).statement),
+        ('events near a ZIP', 'ix_events_geo_cell_date',
+         db.select(Event.id).where(Event.date >= now, *Event.proximity(30.27, -97.74, 25)[0])),
+        ('materialized series occurrences', 'uq_events_series_id_date',
+         db.select(Event.series_id, Event.date).where(Event.series_id.in_([1, 2]), Event.date >= now)),
+        ('reminder event window', 'ix_events_date_id',
+         db.select(Event.id).where(Event.date >= now, Event.date < now).order_by(Event.date, Event.id).limit(200)),
+        ('volunteer dashboard', 'ix_event_volunteers_volunteer_id_event_id',
+         db.select(EventVolunteer.event_id).where(EventVolunteer.volunteer_id == 1)),
+        ('admin user type counts', 'ix_users_user_type',
+         db.select(db.func.count(User.id)).where(User.user_type == 'volunteer')),
+        ('recent signups', 'ix_users_created_at',
+         db.select(User.id).order_by(User.created_at.desc()).limit(5)),
+        ('admin user search', 'ix_users_username_lower',
+         db.select(User.id).where(prefix_match(User.username, 'ab')).order_by(db.func.lower(User.username)).limit(25)),
+        ('admin event search', 'ix_events_title_lower',
+         db.select(Event.id).where(prefix_match(Event.title, 'ab')).order_by(db.func.lower(Event.title)).limit(25)),
+        ('reset tokens by user', 'ix_password_reset_tokens_user_id',
+         db.select(PasswordResetToken.id).where(PasswordResetToken.user_id == 1)),
+        ('expired reset tokens', 'ix_password_reset_tokens_expires_at',
+         db.select(PasswordResetToken.id).where(PasswordResetToken.expires_at <= now).limit(1000)),
+    ]
+
+
+def explain(statement):
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+    else:
+        # Small tables always plan as sequential scans; ask what the planner would do with the index
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params).all()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+@click.command('upgrade-db')
+def upgrade_db():
+    """Create missing tables, columns and indexes on an existing database"""
+    db.create_all()
+    added = add_missing_columns()
+    for column in added:
+        click.echo(f'Added column {column}')
+    if 'events.signup_count' in added:
+        # The column starts at 0 on existing rows; reserve_spot would overbook until it is recounted
+        fixed = Event.recount_signups()
+        db.session.commit()
+        click.echo(f'Counted signups on {fixed} event(s)')
+    for index in create_missing_indexes():
+        click.echo(f'Created index {index}')
+    if not zip_centroids.installed():
+        click.echo(f'Warning: {CentroidsMissing(zip_centroids.path)}', err=True)
+    
+    if not event_search.installed():
+        event_search.install()
+        event_search.rebuild()
+        click.echo('Installed full-text event search')
+    click.echo('Database is up to date')
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index():
+    """Reindex every event for full-text search"""
+    event_search.install()
+    event_search.rebuild()
+    click.echo('Rebuilt the event search index')
+
+
+@click.command('check-query-plans')
+def check_query_plans():
+    """Fail if a listing query does not use its index"""
+    failures = 0
+    for name, index, statement in listing_query_plans():
+        plan = explain(statement)
+        if index in plan:
+            click.echo(f'ok    {name}: {index}')
+        else:
+            failures += 1
+            click.echo(f'FAIL  {name}: expected {index}\n{plan}')
+    db.session.rollback()
+    
+    if failures:
+        raise SystemExit(1)
+
+
+@click.command('repair-signup-counts')
+def repair_signup_counts():
+    """Recompute Event.signup_count from event_volunteers"""
+    for column in add_missing_columns():
+        click.echo(f'Added column {column}')
+    
+    fixed = Event.recount_signups()
+    db.session.commit()
+    click.echo(f'Repaired signup counts on {fixed} event(s)')
+
+
+@click.command('geocode-events')
+def geocode_events():
+    """Fill latitude, longitude and grid cell on events saved before proximity search"""
+    try:
+        zip_centroids.require()
+    except CentroidsMissing as e:
+        raise click.ClickException(str(e))
+    for column in add_missing_columns():
+        click.echo(f'Added column {column}')
+    
+    zip_codes = db.session.execute(
+        db.select(Event.zip_code).where(Event.geo_cell.is_(None)).distinct()
+    ).scalars().all()
+    located, unknown = 0, set()
+    for zip_code in zip_codes:
+        point = zip_centroids.lookup(zip_code)
+        if point is None:
+            unknown.add(zip_code)
+            continue
+        located += db.session.execute(
+            db.update(Event)
+            .where(Event.zip_code == zip_code, Event.geo_cell.is_(None))
+            .values(latitude=point[0], longitude=point[1], geo_cell=grid_cell(*point))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    
+    click.echo(f'Located {located} event(s)')
+    if unknown:
+        click.echo(f'No centroid for {len(unknown)} ZIP code(s): {", ".join(sorted(unknown)[:20])}')
+
+
+@click.command('import-zip-centroids')
+@click.argument('gazetteer', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', help='Defaults to ZIP_CENTROIDS_PATH')
+def import_zip_centroids(gazetteer, output):
+    """Build the ZIP centroid CSV from a Census ZCTA Gazetteer file; proximity search needs it"""
+    output = output or zip_centroids.path
+    with open(gazetteer, newline='') as source:
+        reader = csv.reader(source, delimiter='\t')
+        header = [name.strip() for name in next(reader)]
+        columns = header.index('GEOID'), header.index('INTPTLAT'), header.index('INTPTLONG')
+        rows = sorted(
+            (normalize_zip(row[columns[0]]), float(row[columns[1]]), float(row[columns[2]]))
+            for row in reader if row and normalize_zip(row[columns[0]])
+        )
+    if not rows:
+        raise click.ClickException(f'No ZCTA rows found in {gazetteer}')
+    
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', newline='') as target:
+        writer = csv.writer(target)
+        writer.writerow(['zip', 'latitude', 'longitude'])
+        writer.writerows((zip5, f'{latitude:.4f}', f'{longitude:.4f}') for zip5, latitude, longitude in rows)
+    click.echo(f'Wrote {len(rows)} ZIP centroids to {output}')
+    click.echo('Run `flask geocode-events` to locate events saved without coordinates')
+
+
+@click.command('import-events')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--organizer', required=True, help='Username of the organization that owns the events')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True)
+def import_events(path, organizer, fmt, chunk_size):
+    """Bulk-import events from a CSV or NDJSON file"""
+    user = User.query.filter_by(username=organizer).first()
+    if user is None or user.user_type != 'organization':
+        raise click.ClickException(f'No organization named {organizer}')
+    fmt = fmt or import_format('', path)
+    if fmt is None:
+        raise click.ClickException('Cannot tell the format from the file name; pass --format')
+    
+    with open(path, 'rb') as stream:
+        report = run_import(stream, fmt, user.id, chunk_size=chunk_size)
+    for error in report['errors']:
+        click.echo(f'row {error["row"]}: ' + '; '.join(f'{field}: {message}' for field, message in error['errors'].items()))
+    if report['errors_truncated']:
+        click.echo(f'... {report["failed"] - len(report["errors"])} more rejected row(s) not shown')
+    click.echo(f'Imported {report["inserted"]} event(s), rejected {report["failed"]} in {report["elapsed_seconds"]}s')
+
+
+@click.command('send-reminders')
+@click.option('--hours', type=float, help='Remind about events starting within this many hours [REMINDER_WINDOW_HOURS]')
+@click.option('--batch-size', default=REMINDER_BATCH_SIZE, show_default=True, help='Messages in flight at once')
+def send_reminders(hours, batch_size):
+    """Email volunteers about events starting soon; safe to run from cron as often as you like.
+    
+    Reminders are claimed a batch at a time. If a run dies mid-batch, a later run retakes its claims
+    once they are REMINDER_CLAIM_TIMEOUT_MINUTES old, so messages that run already handed to SMTP may
+    go out twice.
+    """
+    if not mail_dispatcher.configured:
+        raise click.ClickException('SMTP is not configured; set SMTP_USERNAME and SMTP_PASSWORD')
+    if hours is None:
+        hours = current_app.config.get('REMINDER_WINDOW_HOURS', REMINDER_WINDOW_HOURS)
+    claim_timeout = current_app.config.get('REMINDER_CLAIM_TIMEOUT_MINUTES', REMINDER_CLAIM_TIMEOUT_MINUTES)
+    
+    totals = {'sent': 0, 'failed': 0, 'skipped': 0}
+    for report in dispatch_reminders(hours, batch_size, claim_timeout=claim_timeout):
+        for key in totals:
+            totals[key] += report[key]
+        click.echo(f'batch {report["batch"]}: sent {report["sent"]}, failed {report["failed"]}, '
+                   f'skipped {report["skipped"]} in {report["elapsed_seconds"]}s')
+    click.echo(f'Sent {totals["sent"]} reminder(s), {totals["failed"]} failed and will be retried next run, '
+               f'{totals["skipped"]} already claimed by another run')
+
+
+@click.command('delete-user')
+@click.argument('user_id', type=int)
+def delete_user(user_id):
+    """Delete a user with all their events and signups"""
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f'No user with id {user_id}')
+    report = delete_user_account(user_id)
+    for table, count in report['removed'].items():
+        click.echo(f'{table:<24}{count:>10}')
+    click.echo(f'Finished in {report["elapsed_seconds"]}s')
+
+
+@click.command('purge-idempotency-keys')
+def purge_idempotency_keys():
+    """Delete Idempotency-Key records older than IDEMPOTENCY_TTL"""
+    ttl = current_app.config.get('IDEMPOTENCY_TTL', 86400)
+    total = 0
+    while True:
+        removed = IdempotencyKey.purge_expired(ttl)
+        total += removed
+        if not removed:
+            break
+    click.echo(f'Removed {total} expired idempotency key(s)')
+
+
+@click.command('purge-reset-tokens')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction')
+def purge_reset_tokens(batch_size):
+    """Delete used and expired password reset tokens"""
+    total = 0
+    while True:
+        removed = PasswordResetToken.purge_expired(batch_size)
+        total += removed
+        if not removed:
+            break
+    click.echo(f'Removed {total} expired password reset token(s)')
+
+
+@click.command('benchmark-passwords')
+@click.option('--method', 'methods', multiple=True,
+              default=['pbkdf2:sha256:600000', 'pbkdf2:sha256:260000', 'scrypt:32768:8:1', 'scrypt:16384:8:1'])
+@click.option('--workers', 'worker_counts', multiple=True, type=int, default=[0, 2, 4])
+@click.option('--logins', default=40, help='Password checks per configuration')
+@click.option('--threads', default=8, help='Concurrent request threads')
+def benchmark_passwords(methods, worker_counts, logins, threads):
+    """Report password checks (logins) per second for each hashing configuration"""
+    click.echo(f'{"method":<24}{"verify workers":>16}{"logins/sec":>12}')
+    for method in methods:
+        hasher = PasswordHasher()
+        hasher.backend = HASHERS['werkzeug'](method)
+        password_hash = hasher.hash('benchmark-password')
+        for workers in worker_counts:
+            hasher.set_workers(workers)
+            with ThreadPoolExecutor(max_workers=threads) as requests:
+                started = time.perf_counter()
+                list(requests.map(lambda _: hasher.verify(password_hash, 'benchmark-password'), range(logins)))
+                elapsed = time.perf_counter() - started
+            hasher.set_workers(0)
+            click.echo(f'{method:<24}{workers or "inline":>16}{logins / elapsed:>12.1f}')
+
+
+@click.command('benchmark-chatbot')
+@click.option('--sizes', default='10,100,500,1000', help='Comma-separated intent table sizes')
+@click.option('--messages', default=2000, help='Messages matched per table size')
+def benchmark_chatbot(sizes, messages):
+    """Compare per-message intent matching cost against a linear keyword scan"""
+    rng = random.Random(42)
+    
+    def word():
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+    
+    sample = [' '.join(word() for _ in range(rng.randint(5, 25))) for _ in range(messages)]
+    click.echo(f'{"intents":>8}{"automaton us/msg":>20}{"linear scan us/msg":>22}')
+    for size in (int(n) for n in sizes.split(',')):
+        intents = [{'keywords': [word() for _ in range(3)], 'response': str(i)} for i in range(size)]
+        matcher = IntentMatcher(intents, 'fallback')
+        
+        started = time.perf_counter()
+        for message in sample:
+            matcher.respond(message)
+        automaton = (time.perf_counter() - started) / messages * 1e6
+        
+        started = time.perf_counter()
+        for message in sample:
+            message_lower = message.lower()
+            next((intent['response'] for intent in intents
+                  if any(keyword in message_lower for keyword in intent['keywords'])), 'fallback')
+        linear = (time.perf_counter() - started) / messages * 1e6
+        
+        click.echo(f'{size:>8}{automaton:>20.1f}{linear:>22.1f}')
+
+
+def register_commands(app):
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(repair_signup_counts)
+    app.cli.add_command(geocode_events)
+    app.cli.add_command(import_zip_centroids)
+    app.cli.add_command(import_events)
+    app.cli.add_command(purge_idempotency_keys)
+    app.cli.add_command(purge_reset_tokens)
+    app.cli.add_command(send_reminders)
+    app.cli.add_command(delete_user)
+    app.cli.add_command(benchmark_passwords)
+    app.cli.add_command(benchmark_chatbot)
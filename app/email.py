@@ -1,39 +1,176 @@
-import os
+import queue
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app
+from markupsafe import escape
 
-def send_email(to_email, subject, html_content, text_content=None):
-    smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.environ.get('SMTP_PORT', 587))
-    smtp_username = os.environ.get('SMTP_USERNAME')
-    smtp_password = os.environ.get('SMTP_PASSWORD')
-    from_email = os.environ.get('FROM_EMAIL', smtp_username)
-    
-    if not all([smtp_username, smtp_password]):
-        return False
+class MailDispatcher:
+    """Queues outbound mail and delivers it from a worker thread over one reused SMTP session"""
     
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = from_email
-        msg['To'] = to_email
-        
-        if text_content:
-            part1 = MIMEText(text_content, 'plain')
-            msg.attach(part1)
-        
-        part2 = MIMEText(html_content, 'html')
-        msg.attach(part2)
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-        
+    def __init__(self):
+        self.smtp_server = 'smtp.gmail.com'
+        self.smtp_port = 587
+        self.smtp_username = None
+        self.smtp_password = None
+        self.from_email = None
+        self.use_tls = True
+        self.batch_size = 20
+        self.max_retries = 3
+        self.retry_backoff = 1.0
+        self.idle_timeout = 30.0
+        self.queue = queue.Queue(maxsize=10000)
+        self._connection = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._failed = 0
+        self._retries = 0
+        self._latency_total = 0.0
+        self._latency_last = 0.0
+    
+    def init_app(self, app):
+        config = app.config
+        self.smtp_server = config.get('SMTP_SERVER', self.smtp_server)
+        self.smtp_port = config.get('SMTP_PORT', self.smtp_port)
+        self.smtp_username = config.get('SMTP_USERNAME')
+        self.smtp_password = config.get('SMTP_PASSWORD')
+        self.from_email = config.get('FROM_EMAIL') or self.smtp_username
+        self.use_tls = config.get('SMTP_USE_TLS', self.use_tls)
+        self.batch_size = config.get('MAIL_BATCH_SIZE', self.batch_size)
+        self.max_retries = config.get('MAIL_MAX_RETRIES', self.max_retries)
+        self.retry_backoff = config.get('MAIL_RETRY_BACKOFF', self.retry_backoff)
+        self.idle_timeout = config.get('MAIL_IDLE_TIMEOUT', self.idle_timeout)
+    
+    @property
+    def configured(self):
+        # A plain-text relay (e.g. a local debugging server) needs no credentials
+        return bool(self.smtp_username and self.smtp_password) or not self.use_tls
+    
+    def enqueue(self, msg, on_done=None):
+        """Queue msg; on_done(delivered) is called from the worker thread once it is sent or given up on"""
+        if not self.configured:
+            return False
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait((msg, on_done))
+        except queue.Full:
+            return False
         return True
-        
+    
+    def join(self):
+        """Block until every queued message has been delivered or dropped"""
+        self.queue.join()
+    
+    def metrics(self):
+        with self._lock:
+            sent = self._sent
+            return {
+                'queue_depth': self.queue.qsize(),
+                'sent': sent,
+                'failed': self._failed,
+                'retries': self._retries,
+                'avg_send_latency_ms': round(self._latency_total / sent * 1000, 2) if sent else 0.0,
+                'last_send_latency_ms': round(self._latency_last * 1000, 2),
+            }
+    
+    def _ensure_worker(self):
+        # Started lazily so each gunicorn worker gets its own thread after fork
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='mail-dispatcher', daemon=True)
+                self._worker.start()
+    
+    def _run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                self._disconnect()
+                continue
+            
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            for msg, on_done in batch:
+                try:
+                    delivered = self._deliver(msg)
+                    if on_done is not None:
+                        on_done(delivered)
+                finally:
+                    self.queue.task_done()
+    
+    def _deliver(self, msg):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                self._connect().send_message(msg)
+            except Exception:
+                self._disconnect()
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self._failed += 1
+                    return False
+                with self._lock:
+                    self._retries += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._sent += 1
+                self._latency_total += elapsed
+                self._latency_last = elapsed
+            return True
+    
+    def _connect(self):
+        if self._connection is None:
+            connection = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+            try:
+                if self.use_tls:
+                    connection.starttls()
+                if self.smtp_username and self.smtp_password:
+                    connection.login(self.smtp_username, self.smtp_password)
+            except Exception:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+    
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except Exception:
+                self._connection.close()
+            self._connection = None
+
+
+mail_dispatcher = MailDispatcher()
+
+def build_message(to_email, subject, html_content, text_content=None):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = mail_dispatcher.from_email
+    msg['To'] = to_email
+    
+    if text_content:
+        part1 = MIMEText(text_content, 'plain')
+        msg.attach(part1)
+    
+    part2 = MIMEText(html_content, 'html')
+    msg.attach(part2)
+    return msg
+
+def send_email(to_email, subject, html_content, text_content=None, on_done=None):
+    """Queue a message for background delivery; returns False if it could not be queued"""
+    try:
+        return mail_dispatcher.enqueue(build_message(to_email, subject, html_content, text_content), on_done)
     except Exception:
         return False
 
@@ -103,4 +240,73 @@ def send_password_reset_email(user, token):
     © 2024 Community Connect
     """
     
-    return send_email(user.email, subject, html_content, text_content)
\ No newline at end of file
+    return send_email(user.email, subject, html_content, text_content)
+
+
+def send_event_reminder_email(to_email, username, event, on_done=None):
+    """Queue a reminder about an upcoming event; on_done(delivered) runs once the SMTP send finishes"""
+    event_url = f"{current_app.config.get('BASE_URL', 'http://localhost:5001')}/events/{event.id}"
+    when = event.date.strftime('%A, %B %d, %Y at %I:%M %p')
+    location = f"{event.address}, {event.city}, {event.state} {event.zip_code}"
+    
+    subject = f"Reminder: {event.title} - Community Connect"
+    
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: #4285f4; color: white; padding: 20px; text-align: center; }}
+            .content {{ padding: 30px; background: #f9f9f9; }}
+            .button {{ display: inline-block; padding: 12px 24px; background: #4285f4; color: white; 
+                     text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+            .footer {{ text-align: center; padding: 20px; color: #666; font-size: 12px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Community Connect</h1>
+            </div>
+            <div class="content">
+                <h2>See you soon!</h2>
+                <p>Hello {escape(username)},</p>
+                <p>This is a reminder that you signed up to volunteer at <strong>{escape(event.title)}</strong>.</p>
+                <p><strong>When:</strong> {when}<br>
+                <strong>Where:</strong> {escape(location)}</p>
+                
+                <p style="text-align: center;">
+                    <a href="{event_url}" class="button">View Event</a>
+                </p>
+                
+                <p>If you can no longer make it, please cancel your signup on the event page so someone else can take your spot.</p>
+            </div>
+            <div class="footer">
+                <p>© 2024 Community Connect. All rights reserved.</p>
+                <p>This is an automated message, please do not reply to this email.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    text_content = f"""
+    Reminder: {event.title} - Community Connect
+    
+    Hello {username},
+    
+    This is a reminder that you signed up to volunteer at {event.title}.
+    
+    When: {when}
+    Where: {location}
+    
+    {event_url}
+    
+    If you can no longer make it, please cancel your signup on the event page so someone else can take your spot.
+    
+    © 2024 Community Connect
+    """
+    
+    return send_email(to_email, subject, html_content, text_content, on_done)
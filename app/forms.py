@@ -1,8 +1,18 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, DateTimeField, IntegerField, SelectField, SubmitField, BooleanField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
+from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange, Optional
 from datetime import datetime
 
+EVENT_DATE_FORMAT = '%Y-%m-%dT%H:%M'
+
+def check_event_date(event_datetime):
+    if event_datetime < datetime.now():
+        raise ValidationError('Event date must be in the future.')
+
+def check_max_volunteers(max_volunteers):
+    if max_volunteers <= 0:
+        raise ValidationError('Maximum volunteers must be greater than 0.')
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -64,17 +74,25 @@ class EventForm(FlaskForm):
     zip_code = StringField('ZIP Code', validators=[DataRequired(), Length(max=20)])
     max_volunteers = IntegerField('Maximum Volunteers', default=10, 
                                   validators=[DataRequired(), NumberRange(min=1, max=100, message='Must be between 1 and 100')])
+    repeats = SelectField('Repeats', choices=[('', 'Does not repeat'), ('daily', 'Every day'), ('weekly', 'Every week')],
+                          default='', validators=[Optional()])
+    repeat_until = StringField('Repeat Until', validators=[Optional()])
     submit = SubmitField('Create Event')
     
     def validate_date(self, date):
         try:
-            event_datetime = datetime.strptime(date.data, '%Y-%m-%dT%H:%M')
-            current_datetime = datetime.now()
-            if event_datetime < current_datetime:
-                raise ValidationError('Event date must be in the future.')
+            event_datetime = datetime.strptime(date.data, EVENT_DATE_FORMAT)
         except ValueError:
-            pass
+            return
+        check_event_date(event_datetime)
     
     def validate_max_volunteers(self, max_volunteers):
-        if max_volunteers.data <= 0:
-            raise ValidationError('Maximum volunteers must be greater than 0.')
\ No newline at end of file
+        check_max_volunteers(max_volunteers.data)
+    
+    def validate_repeat_until(self, repeat_until):
+        try:
+            until = datetime.strptime(repeat_until.data, '%Y-%m-%d')
+        except ValueError:
+            raise ValidationError('Use the YYYY-MM-DD format.')
+        if until < datetime.now():
+            raise ValidationError('Repeat until must be in the future.')
\ No newline at end of file
@@ -0,0 +1,94 @@
+import csv
+import math
+import os
+import re
+import threading
+
+# Not shipped with the code: build it with `flask import-zip-centroids <Census ZCTA Gazetteer file>`
+DEFAULT_CENTROIDS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'zip_centroids.csv')
+
+# Events are bucketed into a fixed lat/lon grid so a radius query only reads the cells around it
+GRID_DEGREES = 0.25
+GRID_COLUMNS = int(360 / GRID_DEGREES)
+MILES_PER_DEGREE = 69.0
+DEFAULT_RADIUS_MILES = 25
+MAX_RADIUS_MILES = 100
+
+
+class CentroidsMissing(ValueError):
+    """Proximity search was used before the ZIP centroid table was built"""
+    
+    def __init__(self, path):
+        super().__init__(f'ZIP centroid data is not installed ({path}); '
+                         'run `flask import-zip-centroids <Census ZCTA Gazetteer file>`')
+
+
+def normalize_zip(zip_code):
+    """First five digits of a US ZIP or ZIP+4, or None"""
+    match = re.match(r'\s*(\d{5})', zip_code or '')
+    return match.group(1) if match else None
+
+
+def grid_cell(latitude, longitude):
+    row = int((latitude + 90) // GRID_DEGREES)
+    column = int((longitude + 180) // GRID_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def covering_cells(latitude, longitude, radius):
+    """Every grid cell overlapping the bounding box of a radius-mile circle"""
+    lat_delta = radius / MILES_PER_DEGREE
+    lon_delta = radius / (MILES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    
+    rows = range(grid_cell(max(latitude - lat_delta, -90), 0) // GRID_COLUMNS,
+                 grid_cell(min(latitude + lat_delta, 89.999), 0) // GRID_COLUMNS + 1)
+    first = int((longitude - lon_delta + 180) // GRID_DEGREES)
+    last = int((longitude + lon_delta + 180) // GRID_DEGREES)
+    columns = {column % GRID_COLUMNS for column in range(first, last + 1)}
+    return sorted(row * GRID_COLUMNS + column for row in rows for column in columns)
+
+
+class ZipCentroids:
+    """ZIP code to (latitude, longitude) from a bundled offline CSV, loaded once per worker"""
+    
+    def __init__(self, path=DEFAULT_CENTROIDS_PATH):
+        self.path = path
+        self._table = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.path = app.config.get('ZIP_CENTROIDS_PATH') or DEFAULT_CENTROIDS_PATH
+        self._table = None
+        if not self.installed():
+            app.logger.warning('%s; proximity search is disabled and new events are not geocoded',
+                               CentroidsMissing(self.path))
+    
+    def installed(self):
+        return bool(self._load())
+    
+    def require(self):
+        """Raise CentroidsMissing unless the table has been built"""
+        if not self.installed():
+            raise CentroidsMissing(self.path)
+    
+    def lookup(self, zip_code):
+        """(latitude, longitude) for a ZIP, or None if it is unknown or the table is not installed"""
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return None
+        return self._load().get(zip5)
+    
+    def _load(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    if not os.path.exists(self.path):
+                        # Not cached, so the table is picked up once it has been imported
+                        return {}
+                    with open(self.path, newline='') as f:
+                        rows = csv.DictReader(line for line in f if not line.startswith('#'))
+                        self._table = {row['zip']: (float(row['latitude']), float(row['longitude'])) for row in rows}
+        return self._table
+
+
+zip_centroids = ZipCentroids()
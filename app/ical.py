@@ -0,0 +1,123 @@
+import hashlib
+from datetime import datetime, timedelta
+from flask import url_for
+from app import db
+from app.models import Event, EventSeries, EventVolunteer
+
+PRODID = '-//Community Connect//Volunteer Events//EN'
+# Events only store a start time; calendars need an end to draw them
+EVENT_DURATION = 'PT2H'
+FEED_PAST_DAYS = 30
+ICAL_DATE_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def escape_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces as RFC 5545 requires, never inside a UTF-8 character"""
+    if len(line.encode()) <= 75:
+        return line
+    pieces, current, size = [], '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            pieces.append(current)
+            # Continuation lines start with a space, which counts towards their 75 octets
+            current, size = ' ', 1
+        current += char
+        size += width
+    pieces.append(current)
+    return '\r\n'.join(pieces)
+
+
+def feed_cutoff(now=None):
+    """Feeds keep a month of history; day precision keeps the validators stable within a day"""
+    now = now or datetime.utcnow()
+    return (now - timedelta(days=FEED_PAST_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def feed_freshness(user, cutoff):
+    """(validators, last modified) for a user's feed, from one or two aggregate queries"""
+    if user.user_type == 'organization':
+        last_modified, count, _ = Event.freshness(
+            Event.organizer_id == user.id, Event.series_id.is_(None), Event.date >= cutoff
+        )
+        series_modified, series_count = EventSeries.freshness(EventSeries.organizer_id == user.id)
+        latest = max((value for value in (last_modified, series_modified) if value), default=None)
+        return (count, last_modified, series_count, series_modified), latest
+    
+    last_modified, count, newest_signup = db.session.execute(
+        db.select(
+            db.func.max(db.func.coalesce(Event.updated_at, Event.created_at)),
+            db.func.count(EventVolunteer.id),
+            db.func.max(EventVolunteer.id),
+        ).join(Event, Event.id == EventVolunteer.event_id)
+        .where(EventVolunteer.volunteer_id == user.id, Event.date >= cutoff)
+    ).one()
+    return (count, newest_signup, last_modified), last_modified
+
+
+def feed_events(user, cutoff):
+    if user.user_type == 'organization':
+        # Materialized occurrences are already covered by their series' RRULE
+        return Event.query.filter(
+            Event.organizer_id == user.id, Event.series_id.is_(None), Event.date >= cutoff
+        ).order_by(Event.date.asc()).all()
+    return Event.query.join(EventVolunteer, EventVolunteer.event_id == Event.id).filter(
+        EventVolunteer.volunteer_id == user.id, Event.date >= cutoff
+    ).order_by(Event.date.asc()).all()
+
+
+def feed_series(user, cutoff):
+    if user.user_type != 'organization':
+        return []
+    return EventSeries.query.filter(
+        EventSeries.organizer_id == user.id, db.or_(EventSeries.until.is_(None), EventSeries.until >= cutoff)
+    ).order_by(EventSeries.starts_at.asc()).all()
+
+
+def vevent(uid, item, start, extra=()):
+    stamp = item.updated_at or item.created_at or datetime.utcnow()
+    return [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp.strftime(ICAL_DATE_FORMAT)}Z',
+        # Event times are stored as entered, so they stay floating local times
+        f'DTSTART:{start.strftime(ICAL_DATE_FORMAT)}',
+        f'DURATION:{EVENT_DURATION}',
+        f'SUMMARY:{escape_text(item.title)}',
+        f'DESCRIPTION:{escape_text(item.description)}',
+        f'LOCATION:{escape_text(f"{item.address}, {item.city}, {item.state} {item.zip_code}")}',
+        *extra,
+        'END:VEVENT',
+    ]
+
+
+def render_feed(user, host, cutoff):
+    """The iCalendar body for a volunteer's signups or an organization's events and series"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(f"Community Connect - {user.username}")}',
+    ]
+    for event in feed_events(user, cutoff):
+        url = url_for('main.event_detail', event_id=event.id, _external=True)
+        lines += vevent(f'event-{event.id}@{host}', event, event.date, [f'URL:{url}'])
+    for series in feed_series(user, cutoff):
+        rule = f'RRULE:FREQ={series.frequency.upper()};INTERVAL={series.interval}'
+        if series.until is not None:
+            rule += f';UNTIL={series.until.strftime(ICAL_DATE_FORMAT)}'
+        lines += vevent(f'series-{series.id}@{host}', series, series.starts_at, [rule])
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def feed_cache_key(user, host, validators):
+    digest = hashlib.sha1(repr((host, validators)).encode()).hexdigest()
+    return f'feed:{user.id}@{digest}'
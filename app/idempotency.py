@@ -0,0 +1,83 @@
+import hashlib
+import itertools
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request, Response
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IdempotencyKey
+
+_new_keys = itertools.count(1)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def idempotent(view):
+    """Replay the stored response when a request repeats its Idempotency-Key.
+    
+    Place below @login_required; keys are scoped to the current user.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+        
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', 86400)
+        key_hash = _sha256(key.encode())
+        request_hash = _sha256(request.method.encode() + request.path.encode() + b'\n' + request.get_data())
+        
+        record = IdempotencyKey(user_id=current_user.id, key_hash=key_hash, request_hash=request_hash)
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = IdempotencyKey.query.filter_by(user_id=current_user.id, key_hash=key_hash).first()
+            if existing is not None and existing.created_at < datetime.utcnow() - timedelta(seconds=ttl):
+                db.session.delete(existing)
+                db.session.commit()
+                return wrapper(*args, **kwargs)
+            if existing is None or existing.status_code is None:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            if existing.request_hash != request_hash:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            
+            response = Response(existing.response_body, status=existing.status_code, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        record_id = record.id
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _forget(record_id)
+            raise
+        
+        if response.status_code >= 500:
+            # Server errors are worth retrying, so do not pin them to the key
+            _forget(record_id)
+        else:
+            db.session.execute(
+                db.update(IdempotencyKey)
+                .where(IdempotencyKey.id == record_id)
+                .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+            )
+            db.session.commit()
+        
+        if next(_new_keys) % current_app.config.get('IDEMPOTENCY_PURGE_EVERY', 100) == 0:
+            IdempotencyKey.purge_expired(ttl)
+        return response
+    
+    return wrapper
+
+
+def _forget(record_id):
+    db.session.rollback()
+    db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.id == record_id))
+    db.session.commit()
@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from wtforms.validators import Length, NumberRange, ValidationError
+from app import db
+from app.forms import EventForm, check_event_date, check_max_volunteers
+from app.geo import zip_centroids, grid_cell
+from app.models import Event
+from app.page_cache import page_cache
+from app.stats import admin_stats
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+TEXT_FIELDS = ('title', 'description', 'address', 'city', 'state', 'zip_code')
+
+
+def _form_limits(name, kind):
+    """The first validator of a kind declared on an EventForm field"""
+    for validator in getattr(EventForm, name).kwargs.get('validators', ()):
+        if isinstance(validator, kind):
+            return validator
+    return None
+
+
+# Read limits off EventForm so the importer and the form cannot drift apart
+MAX_LENGTHS = {name: _form_limits(name, Length).max for name in TEXT_FIELDS if _form_limits(name, Length)}
+VOLUNTEER_RANGE = _form_limits('max_volunteers', NumberRange)
+
+
+def import_format(mimetype, filename=''):
+    if mimetype in ('application/x-ndjson', 'application/jsonl') or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if mimetype in ('text/csv', 'application/csv') or filename.endswith('.csv'):
+        return 'csv'
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict, parse error) from a binary CSV or NDJSON stream, one line at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'Not valid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Each line must be a JSON object'
+            continue
+        yield line_number, row, None
+
+
+def validate_row(row):
+    """(insert values, {field: message}) for one row, checked with the EventForm rules"""
+    values = {}
+    errors = {}
+    for name in TEXT_FIELDS:
+        value = str(row.get(name) or '').strip()
+        if not value:
+            errors[name] = 'This field is required.'
+        elif name in MAX_LENGTHS and len(value) > MAX_LENGTHS[name]:
+            errors[name] = f'Field cannot be longer than {MAX_LENGTHS[name]} characters.'
+        values[name] = value
+    
+    try:
+        values['date'] = datetime.fromisoformat(str(row.get('date') or '').strip())
+        if values['date'].tzinfo is not None:
+            raise ValidationError('Give the date in local time without a UTC offset.')
+        check_event_date(values['date'])
+    except ValidationError as e:
+        errors['date'] = str(e)
+    except ValueError:
+        errors['date'] = 'Use the YYYY-MM-DDTHH:MM format.'
+    
+    try:
+        max_volunteers = row.get('max_volunteers')
+        values['max_volunteers'] = 10 if max_volunteers in (None, '') else int(max_volunteers)
+        check_max_volunteers(values['max_volunteers'])
+        if not VOLUNTEER_RANGE.min <= values['max_volunteers'] <= VOLUNTEER_RANGE.max:
+            raise ValidationError(VOLUNTEER_RANGE.message)
+    except ValidationError as e:
+        errors['max_volunteers'] = str(e)
+    except (TypeError, ValueError):
+        errors['max_volunteers'] = 'Not a valid integer value.'
+    
+    # Core inserts bypass Event's zip_code validator, so locate the event here
+    point = zip_centroids.lookup(values['zip_code'])
+    values['latitude'], values['longitude'] = point or (None, None)
+    values['geo_cell'] = grid_cell(*point) if point else None
+    return values, errors
+
+
+def import_events(stream, fmt, organizer_id, chunk_size=IMPORT_CHUNK_SIZE, max_errors=IMPORT_MAX_REPORTED_ERRORS):
+    """Validate and insert events from a CSV or NDJSON stream in chunked multi-row inserts.
+    
+    Each chunk commits on its own; returns counts plus up to max_errors per-row errors.
+    """
+    started = time.perf_counter()
+    report = {'inserted': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    
+    def reject(line_number, errors):
+        report['failed'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({'row': line_number, 'errors': errors})
+    
+    def flush():
+        try:
+            db.session.execute(db.insert(Event), [values for _, values in chunk])
+            db.session.commit()
+            report['inserted'] += len(chunk)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for line_number, _ in chunk:
+                reject(line_number, {'row': f'Rejected by the database with its chunk: {e.__class__.__name__}'})
+        chunk.clear()
+    
+    for line_number, row, error in read_rows(stream, fmt):
+        if error:
+            reject(line_number, {'row': error})
+            continue
+        values, errors = validate_row(row)
+        if errors:
+            reject(line_number, errors)
+            continue
+        values['organizer_id'] = organizer_id
+        chunk.append((line_number, values))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    
+    if report['inserted']:
+        page_cache.invalidate_event()
+        admin_stats.invalidate()
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return report
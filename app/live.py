@@ -0,0 +1,159 @@
+import json
+import queue
+import threading
+import time
+from app import db
+
+
+class Subscriber:
+    def __init__(self, event_ids, max_pending):
+        self.event_ids = frozenset(event_ids)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.closed = False
+
+
+class LiveHub:
+    """In-process pub/sub of event capacity changes for Server-Sent Events streams.
+    
+    Signups and cancels in this worker publish immediately. A single watcher
+    thread per worker polls the subscribed events so changes made by other
+    workers still arrive within LIVE_POLL_INTERVAL seconds.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.max_connections = 1000
+        self.max_pending = 20
+        self.poll_interval = 2.0
+        self.heartbeat = 15.0
+        self._subscribers = {}
+        self._last_state = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._dropped = 0
+        self._published = 0
+    
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        self.max_connections = config.get('LIVE_MAX_CONNECTIONS', self.max_connections)
+        self.max_pending = config.get('LIVE_MAX_PENDING', self.max_pending)
+        self.poll_interval = config.get('LIVE_POLL_INTERVAL', self.poll_interval)
+        self.heartbeat = config.get('LIVE_HEARTBEAT', self.heartbeat)
+    
+    def subscribe(self, states):
+        """Register a stream for {event_id: (signup_count, max_volunteers)} the client already has.
+        
+        Returns None when the connection limit is reached.
+        """
+        subscriber = Subscriber(states, self.max_pending)
+        with self._lock:
+            if self._connection_count() >= self.max_connections:
+                return None
+            for event_id, state in states.items():
+                self._subscribers.setdefault(event_id, set()).add(subscriber)
+                self._last_state.setdefault(event_id, state)
+        self._ensure_watcher()
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscriber.closed = True
+            for event_id in subscriber.event_ids:
+                subscribers = self._subscribers.get(event_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[event_id]
+                        self._last_state.pop(event_id, None)
+    
+    def publish(self, event_id, signup_count, max_volunteers):
+        state = (signup_count, max_volunteers)
+        with self._lock:
+            if self._last_state.get(event_id) == state:
+                return
+            self._last_state[event_id] = state
+            subscribers = list(self._subscribers.get(event_id, ()))
+        
+        message = capacity_message(event_id, signup_count, max_volunteers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # A client that cannot keep up is cut off instead of buffering without bound
+                self._drop(subscriber)
+        with self._lock:
+            self._published += 1
+    
+    def notify(self, event_id):
+        """Publish the current capacity of an event if anyone here is watching it"""
+        with self._lock:
+            if event_id not in self._subscribers:
+                return
+        from app.models import Event
+        row = db.session.execute(
+            db.select(Event.signup_count, Event.max_volunteers).where(Event.id == event_id)
+        ).first()
+        if row is not None:
+            self.publish(event_id, row.signup_count, row.max_volunteers)
+    
+    def metrics(self):
+        with self._lock:
+            return {
+                'connections': self._connection_count(),
+                'watched_events': len(self._subscribers),
+                'max_connections': self.max_connections,
+                'published': self._published,
+                'dropped_slow_clients': self._dropped,
+            }
+    
+    def _connection_count(self):
+        return len({id(s) for subscribers in self._subscribers.values() for s in subscribers})
+    
+    def _drop(self, subscriber):
+        self.unsubscribe(subscriber)
+        with self._lock:
+            self._dropped += 1
+        try:
+            while True:
+                subscriber.queue.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.queue.put_nowait(None)
+    
+    def _ensure_watcher(self):
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name='live-hub-watcher', daemon=True)
+                self._watcher.start()
+    
+    def _watch(self):
+        from app.models import Event
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                event_ids = list(self._subscribers)
+            if not event_ids:
+                continue
+            try:
+                with self.app.app_context():
+                    rows = db.session.execute(
+                        db.select(Event.id, Event.signup_count, Event.max_volunteers).where(Event.id.in_(event_ids))
+                    ).all()
+            except Exception:
+                continue
+            for row in rows:
+                self.publish(row.id, row.signup_count, row.max_volunteers)
+
+
+def capacity_message(event_id, signup_count, max_volunteers):
+    data = json.dumps({
+        'event_id': event_id,
+        'volunteers_count': signup_count,
+        'max_volunteers': max_volunteers,
+        'spots_remaining': max_volunteers - signup_count,
+    })
+    return f'event: capacity\ndata: {data}\n\n'
+
+
+live_hub = LiveHub()
@@ -1,8 +1,18 @@
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, validates
+import hashlib
+import math
 import secrets
 from app import db, login_manager
+from app.passwords import password_hasher
+from app.geo import zip_centroids, grid_cell, covering_cells, MILES_PER_DEGREE
+
+
+def postgres_index(name, expression):
+    """An index only Postgres builds, from create_all and from `flask upgrade-db` alike"""
+    return db.Index(name, expression, info={'dialect': 'postgresql'}).ddl_if(dialect='postgresql')
+
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -11,9 +21,9 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
-    user_type = db.Column(db.String(20), nullable=False, default='volunteer')
+    user_type = db.Column(db.String(20), nullable=False, default='volunteer', index=True)
     is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Google OAuth fields
     google_id = db.Column(db.String(120), unique=True, nullable=True)
@@ -21,24 +31,34 @@ class User(UserMixin, db.Model):
     given_name = db.Column(db.String(64), nullable=True)
     family_name = db.Column(db.String(64), nullable=True)
     
+    # Secret part of the user's calendar feed URL; rotating it cuts off every existing subscription
+    calendar_token = db.Column(db.String(64), unique=True, index=True, nullable=True)
+    
     # Relationships
     password_reset_tokens = db.relationship('PasswordResetToken', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash or not password_hasher.verify(self.password_hash, password):
+            return False
+        
+        # Upgrade hashes made with older cost parameters on the next successful login
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            db.session.commit()
+        return True
     
     def generate_password_reset_token(self):
         """Generate a password reset token"""
         # Invalidate any existing tokens
         PasswordResetToken.query.filter_by(user_id=self.id).delete()
         
-        # Create new token
+        # Create new token; only its hash is stored, so a database leak cannot be replayed
         token = secrets.token_urlsafe(32)
         reset_token = PasswordResetToken(
-            token=token,
+            token_hash=PasswordResetToken.hash_token(token),
             user_id=self.id,
             expires_at=datetime.utcnow() + timedelta(hours=1)  # 1 hour expiry
         )
@@ -48,11 +68,48 @@ class User(UserMixin, db.Model):
     
     @staticmethod
     def verify_password_reset_token(token):
-        """Verify a password reset token"""
-        reset_token = PasswordResetToken.query.filter_by(token=token).first()
-        if reset_token and reset_token.is_valid():
-            return reset_token.user
-        return None
+        """The user a valid reset token belongs to, in one indexed query; the token stays usable"""
+        return User.query.join(PasswordResetToken, PasswordResetToken.user_id == User.id).filter(
+            PasswordResetToken.token_hash == PasswordResetToken.hash_token(token),
+            *PasswordResetToken.valid_criteria()
+        ).first()
+    
+    @staticmethod
+    def consume_password_reset_token(token):
+        """Validate a reset token and mark it used in a single UPDATE; returns its user or None.
+        
+        Does not commit, so the caller's password change lands in the same transaction.
+        """
+        now = datetime.utcnow()
+        user_id = db.session.execute(
+            db.update(PasswordResetToken)
+            .where(PasswordResetToken.token_hash == PasswordResetToken.hash_token(token),
+                   *PasswordResetToken.valid_criteria(now))
+            # Used tokens expire on the spot, so the reaper only has to look at expires_at
+            .values(used=True, expires_at=now)
+            .returning(PasswordResetToken.user_id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        return db.session.get(User, user_id) if user_id is not None else None
+    
+    def calendar_feed_token(self):
+        """The token for this user's calendar feed, created on first use"""
+        if self.calendar_token is None:
+            self.reset_calendar_token()
+        return self.calendar_token
+    
+    def reset_calendar_token(self):
+        self.calendar_token = secrets.token_urlsafe(32)
+        db.session.commit()
+    
+    def touch_organized(self):
+        """Bump updated_at on everything this user organizes, so pages showing their name revalidate"""
+        now = datetime.utcnow()
+        for model in (Event, EventSeries):
+            db.session.execute(
+                db.update(model).where(model.organizer_id == self.id).values(updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
     
     @classmethod
     def get_or_create_google_user(cls, google_data):
@@ -110,29 +167,58 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 
+# Admin prefix search and sorting are case-insensitive, so they run on lower(...)
+db.Index('ix_users_username_lower', db.func.lower(User.username))
+db.Index('ix_users_email_lower', db.func.lower(User.email))
+# Prefix search compares in the C collation on Postgres (see admin_tables.prefix_match)
+postgres_index('ix_users_username_lower_c', db.func.lower(User.username).collate('C'))
+postgres_index('ix_users_email_lower_c', db.func.lower(User.email).collate('C'))
+
+
 class PasswordResetToken(db.Model):
     __tablename__ = 'password_reset_tokens'
     
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(100), unique=True, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # SHA-256 of the emailed token, kept in the original "token" column and its unique index
+    token_hash = db.Column('token', db.String(100), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     used = db.Column(db.Boolean, default=False)
     
-    def is_valid(self):
-        """Check if token is still valid"""
-        return (not self.used) and (datetime.utcnow() < self.expires_at)
+    @staticmethod
+    def hash_token(token):
+        # Tokens carry 256 random bits, so a fast unsalted hash is enough
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    @classmethod
+    def valid_criteria(cls, now=None):
+        return (cls.used.is_(False), cls.expires_at > (now or datetime.utcnow()))
     
-    def mark_as_used(self):
-        """Mark token as used"""
-        self.used = True
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        """Delete up to batch_size expired or used tokens; returns the number removed"""
+        expired = db.select(cls.id).where(
+            db.or_(cls.expires_at <= datetime.utcnow(), cls.used.is_(True))
+        ).limit(batch_size)
+        result = db.session.execute(
+            db.delete(cls).where(cls.id.in_(expired)).execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        return result.rowcount
 
 
 class Event(db.Model):
     __tablename__ = 'events'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Upcoming listings and keyset pages filter and sort on (date, id)
+        db.Index('ix_events_date_id', 'date', 'id'),
+        db.Index('ix_events_organizer_id_date', 'organizer_id', 'date'),
+        db.Index('ix_events_geo_cell_date', 'geo_cell', 'date'),
+        # One materialized row per series occurrence
+        db.Index('uq_events_series_id_date', 'series_id', 'date', unique=True),
+        {'extend_existing': True}
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -142,19 +228,131 @@ class Event(db.Model):
     city = db.Column(db.String(100), nullable=False)
     state = db.Column(db.String(100), nullable=False)
     zip_code = db.Column(db.String(20), nullable=False)
+    # Derived from zip_code; NULL when the ZIP is not in the centroid table
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True)
     max_volunteers = db.Column(db.Integer, default=10)
+    signup_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     organizer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Set on occurrences of a recurring series, which are only stored once someone signs up
+    series_id = db.Column(db.Integer, db.ForeignKey('event_series.id'), nullable=True)
     
     organizer = db.relationship('User', backref='organized_events')
     volunteers = db.relationship('EventVolunteer', backref='event', lazy=True, cascade='all, delete-orphan')
     
+    # Fields exposed by the events API and the columns backing each of them
+    API_FIELDS = ('id', 'title', 'description', 'date', 'location', 'organizer', 'volunteers_count', 'max_volunteers', 'series_id')
+    API_FIELD_COLUMNS = {
+        'location': ('address', 'city', 'state', 'zip_code'),
+        'organizer': (),
+        'volunteers_count': ('signup_count',),
+    }
+    
     def get_full_address(self):
         return f"{self.address}, {self.city}, {self.state} {self.zip_code}"
     
+    @validates('zip_code')
+    def _locate(self, key, zip_code):
+        """Keep the coordinates and grid cell in step with the ZIP code"""
+        point = zip_centroids.lookup(zip_code)
+        self.latitude, self.longitude = point or (None, None)
+        self.geo_cell = grid_cell(*point) if point else None
+        return zip_code
+    
+    @classmethod
+    def proximity(cls, latitude, longitude, radius):
+        """(criteria, squared distance in miles) for events within radius miles of a point.
+        
+        The grid cells narrow the scan through ix_events_geo_cell_date; the flat-earth distance is
+        plain arithmetic so it runs on any database and is accurate enough at city scale.
+        """
+        d_lat = (cls.latitude - latitude) * MILES_PER_DEGREE
+        d_lon = (cls.longitude - longitude) * (MILES_PER_DEGREE * math.cos(math.radians(latitude)))
+        distance = d_lat * d_lat + d_lon * d_lon
+        return [cls.geo_cell.in_(covering_cells(latitude, longitude, radius)), distance <= radius * radius], distance
+    
+    @classmethod
+    def api_select(cls, fields):
+        """Select only the columns needed for the given API fields, ordered by (date, id)"""
+        names = ['id', 'date']
+        for field in fields:
+            for name in cls.API_FIELD_COLUMNS.get(field, (field,)):
+                if name not in names:
+                    names.append(name)
+        
+        query = db.select(*[getattr(cls, name) for name in names])
+        if 'organizer' in fields:
+            query = query.add_columns(User.username.label('organizer')).join(User, User.id == cls.organizer_id)
+        return query.order_by(cls.date.asc(), cls.id.asc())
+    
+    @staticmethod
+    def api_row(row, fields):
+        data = {}
+        for field in fields:
+            if field == 'date':
+                data['date'] = row.date.isoformat()
+            elif field == 'location':
+                data['location'] = f"{row.address}, {row.city}, {row.state} {row.zip_code}"
+            elif field == 'volunteers_count':
+                data['volunteers_count'] = row.signup_count
+            else:
+                data[field] = getattr(row, field)
+        return data
+    
+    @classmethod
+    def listing_query(cls):
+        """Events with organizer loaded in a single round trip"""
+        return cls.query.options(joinedload(cls.organizer))
+    
+    @classmethod
+    def freshness(cls, *criteria):
+        """(last modified, row count, total signups) over matching events, used as a cheap change validator"""
+        last_modified = db.func.max(db.func.coalesce(cls.updated_at, cls.created_at))
+        return db.session.execute(
+            db.select(last_modified, db.func.count(cls.id), db.func.sum(cls.signup_count)).where(*criteria)
+        ).one()
+    
+    @classmethod
+    def reserve_spot(cls, event_id):
+        """Atomically take a spot; returns False if the event is full or missing"""
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.id == event_id, cls.signup_count < cls.max_volunteers)
+            .values(signup_count=cls.signup_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+    
+    @classmethod
+    def release_spots(cls, event_ids):
+        """Give back one spot on each of the given events"""
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id.in_(event_ids), cls.signup_count > 0)
+            .values(signup_count=cls.signup_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+    
+    @classmethod
+    def recount_signups(cls):
+        """Recompute every signup_count from event_volunteers"""
+        actual = db.select(db.func.count(EventVolunteer.id)).where(
+            EventVolunteer.event_id == cls.id
+        ).scalar_subquery()
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.signup_count != actual)
+            .values(signup_count=actual)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
     def volunteers_count(self):
-        return len(self.volunteers)
+        return self.signup_count
     
     def spots_remaining(self):
         return self.max_volunteers - self.volunteers_count()
@@ -173,10 +371,97 @@ class Event(db.Model):
         return f'<Event {self.title}>'
 
 
+db.Index('ix_events_title_lower', db.func.lower(Event.title))
+postgres_index('ix_events_title_lower_c', db.func.lower(Event.title).collate('C'))
+
+
+class EventSeries(db.Model):
+    __tablename__ = 'event_series'
+    
+    FREQUENCIES = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    address = db.Column(db.String(300), nullable=False)
+    city = db.Column(db.String(100), nullable=False)
+    state = db.Column(db.String(100), nullable=False)
+    zip_code = db.Column(db.String(20), nullable=False)
+    max_volunteers = db.Column(db.Integer, default=10)
+    # First occurrence; later ones follow every `interval` days or weeks until `until` (inclusive)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    frequency = db.Column(db.String(10), nullable=False, default='weekly')
+    interval = db.Column(db.Integer, nullable=False, default=1)
+    until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    organizer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    
+    organizer = db.relationship('User', backref='organized_series')
+    occurrences = db.relationship('Event', backref='series', lazy=True)
+    
+    def step(self):
+        return self.FREQUENCIES[self.frequency] * self.interval
+    
+    def occurrence_dates(self, start, end):
+        """Lazily yield occurrence dates in [start, end), jumping straight to the first one in the window"""
+        step = self.step()
+        date = self.starts_at
+        if start > date:
+            date += step * -((date - start) // step)
+        if self.until is not None:
+            end = min(end, self.until + timedelta(microseconds=1))
+        while date < end:
+            yield date
+            date += step
+    
+    def count_between(self, start, end):
+        """Number of occurrence dates in [start, end) without expanding them"""
+        if self.until is not None:
+            end = min(end, self.until + timedelta(microseconds=1))
+        start = max(start, self.starts_at)
+        if start >= end:
+            return 0
+        step = self.step()
+        first = -((self.starts_at - start) // step)
+        last = -((self.starts_at - end) // step)
+        return last - first
+    
+    def is_occurrence(self, date):
+        if date < self.starts_at or (self.until is not None and date > self.until):
+            return False
+        return (date - self.starts_at) % self.step() == timedelta(0)
+    
+    def can_edit(self, user):
+        if not user.is_authenticated:
+            return False
+        return user.id == self.organizer_id or user.is_admin
+    
+    @classmethod
+    def active_between(cls, start, end):
+        return cls.query.options(joinedload(cls.organizer)).filter(
+            cls.starts_at < end, db.or_(cls.until.is_(None), cls.until >= start)
+        )
+    
+    @classmethod
+    def freshness(cls, *criteria):
+        """(last modified, row count) over matching series, used alongside Event.freshness"""
+        return db.session.execute(
+            db.select(db.func.max(db.func.coalesce(cls.updated_at, cls.created_at)), db.func.count(cls.id))
+            .where(*criteria)
+        ).one()
+    
+    def __repr__(self):
+        return f'<EventSeries {self.title} {self.frequency}>'
+
+
 class EventVolunteer(db.Model):
     __tablename__ = 'event_volunteers'
     __table_args__ = (
         db.UniqueConstraint('event_id', 'volunteer_id', name='uq_volunteer_event'),
+        # uq_volunteer_event already covers lookups by event_id
+        db.Index('ix_event_volunteers_volunteer_id_event_id', 'volunteer_id', 'event_id'),
         {'extend_existing': True}
     )
     
@@ -184,8 +469,44 @@ class EventVolunteer(db.Model):
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
     volunteer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     signed_up_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # A reminder run claims a signup before queueing its email and marks it sent once SMTP accepts it;
+    # claims left by a run that died are taken over after REMINDER_CLAIM_TIMEOUT_MINUTES
+    reminder_claimed_at = db.Column(db.DateTime, nullable=True)
+    reminder_sent_at = db.Column(db.DateTime, nullable=True)
     
     volunteer = db.relationship('User', backref='volunteer_registrations')
     
     def __repr__(self):
-        return f'<EventVolunteer event:{self.event_id} volunteer:{self.volunteer_id}>'
\ No newline at end of file
+        return f'<EventVolunteer event:{self.event_id} volunteer:{self.volunteer_id}>'
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key_hash', name='uq_idempotency_user_key'),
+        {'extend_existing': True}
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    key_hash = db.Column(db.String(64), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    # NULL while the original request is still being processed
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    @classmethod
+    def purge_expired(cls, ttl, batch_size=1000):
+        """Delete up to batch_size keys older than ttl seconds; returns the number removed"""
+        expired = db.select(cls.id).where(
+            cls.created_at < datetime.utcnow() - timedelta(seconds=ttl)
+        ).limit(batch_size)
+        result = db.session.execute(
+            db.delete(cls).where(cls.id.in_(expired)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+    
+    def __repr__(self):
+        return f'<IdempotencyKey user:{self.user_id} status:{self.status_code}>'
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import request, session
+from flask_login import current_user
+
+
+class MemoryBackend:
+    """In-process LRU; each gunicorn worker keeps its own copy"""
+    
+    shared = False
+    
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Version counters are kept out of the LRU so eviction can never roll one back
+        self._counters = {}
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                if key in self._counters:
+                    values.append(self._counters[key])
+                    continue
+                entry = self._entries.get(key)
+                if entry is None or (entry[1] is not None and now >= entry[1]):
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+        return values
+    
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    """Shared cache so every worker sees the same pages and invalidations"""
+    
+    shared = True
+    
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('PAGE_CACHE_BACKEND=redis requires the redis package') from e
+        self._client = redis.Redis.from_url(url)
+    
+    def get_many(self, keys):
+        return [value.decode() if value is not None else None for value in self._client.mget(keys)]
+    
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=ttl)
+    
+    def incr(self, key):
+        return self._client.incr(key)
+
+
+class PageCache:
+    """Caches rendered pages for anonymous visitors, keyed on the versions of the data they show"""
+    
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 60
+        self.enabled = True
+        self.prefix = 'page:'
+    
+    def init_app(self, app):
+        config = app.config
+        backend = config.get('PAGE_CACHE_BACKEND', 'memory')
+        self.enabled = backend != 'none'
+        self.ttl = config.get('PAGE_CACHE_TTL', self.ttl)
+        if backend == 'redis':
+            self.backend = RedisBackend(config['PAGE_CACHE_URL'])
+        else:
+            self.backend = MemoryBackend(config.get('PAGE_CACHE_SIZE', 1024))
+    
+    def cacheable(self):
+        return (self.enabled and request.method == 'GET'
+                and not current_user.is_authenticated and '_flashes' not in session)
+    
+    def render(self, name, versions, build):
+        """Return the cached page for name, or build(), cache and return it"""
+        if not self.cacheable():
+            return build()
+        
+        # Every page also depends on 'site', which bulk changes bump
+        version_keys = [f'{self.prefix}version:{version}' for version in ('site',) + tuple(versions)]
+        stamp = '.'.join(str(value or 0) for value in self.backend.get_many(version_keys))
+        return self.fetch(f'{name}@{stamp}', build)
+    
+    def fetch(self, key, build, ttl=None):
+        """Return the cached body for a key that already encodes its data version, or build() and cache it"""
+        if not self.enabled:
+            return build()
+        
+        key = f'{self.prefix}{key}'
+        body = self.backend.get_many([key])[0]
+        if body is None:
+            body = build()
+            self.backend.set(key, body, ttl or self.ttl)
+        return body
+    
+    def bump(self, *versions):
+        if self.enabled:
+            for version in versions:
+                self.backend.incr(f'{self.prefix}version:{version}')
+    
+    def invalidate_event(self, event_id=None):
+        """Call after an event or its signups change; None for a brand new event"""
+        if event_id is None:
+            self.bump('events')
+        else:
+            self.bump('events', f'event:{event_id}')
+    
+    def invalidate_all(self):
+        self.bump('site')
+
+
+page_cache = PageCache()
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class WerkzeugHasher:
+    """Werkzeug password hashing with a configurable method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'"""
+    
+    def __init__(self, method='pbkdf2'):
+        self.method = method
+        # Werkzeug stores the fully expanded method in front of the salt
+        self.prefix = generate_password_hash('', method=method).split('$', 1)[0]
+    
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+    
+    def verify(self, password_hash, password):
+        return check_password_hash(password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+
+class HasherBusy(RuntimeError):
+    """A password check waited longer than PASSWORD_VERIFY_TIMEOUT for a free hashing thread"""
+
+
+HASHERS = {
+    'werkzeug': WerkzeugHasher,
+}
+
+
+class PasswordHasher:
+    """Hashes with the configured backend and optionally verifies in a bounded thread pool"""
+    
+    def __init__(self):
+        self.backend = WerkzeugHasher()
+        self._executor = None
+        self.verify_timeout = 10.0
+    
+    def init_app(self, app):
+        config = app.config
+        backend = HASHERS[config.get('PASSWORD_HASH_BACKEND', 'werkzeug')]
+        self.backend = backend(config.get('PASSWORD_HASH_METHOD', 'pbkdf2'))
+        self.verify_timeout = config.get('PASSWORD_VERIFY_TIMEOUT', self.verify_timeout)
+        self.set_workers(config.get('PASSWORD_VERIFY_WORKERS', 0))
+    
+    def set_workers(self, workers):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-verify') if workers else None
+    
+    def hash(self, password):
+        return self.backend.hash(password)
+    
+    def verify(self, password_hash, password):
+        if self._executor is None:
+            return self.backend.verify(password_hash, password)
+        # Bounds how many hashes run at once across the worker's threads
+        future = self._executor.submit(self.backend.verify, password_hash, password)
+        try:
+            return future.result(self.verify_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HasherBusy('Password check timed out; the hashing pool is saturated') from None
+    
+    def needs_rehash(self, password_hash):
+        return self.backend.needs_rehash(password_hash)
+
+
+password_hasher = PasswordHasher()
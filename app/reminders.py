@@ -0,0 +1,119 @@
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from app import db
+from app.email import mail_dispatcher, send_event_reminder_email
+from app.models import Event, EventVolunteer, User
+
+REMINDER_WINDOW_HOURS = 24
+REMINDER_BATCH_SIZE = 500
+REMINDER_CLAIM_TIMEOUT_MINUTES = 30
+# Events are scanned a page at a time by (date, id); their signups are then read by event_id
+REMINDER_EVENT_PAGE = 200
+
+
+def upcoming_events(start, end, page_size=REMINDER_EVENT_PAGE):
+    """Yield pages of events starting in [start, end), walking ix_events_date_id by keyset"""
+    after = None
+    while True:
+        query = db.select(
+            Event.id, Event.title, Event.date, Event.address, Event.city, Event.state, Event.zip_code
+        ).where(Event.date >= start, Event.date < end)
+        if after is not None:
+            query = query.where(db.tuple_(Event.date, Event.id) > after)
+        page = db.session.execute(query.order_by(Event.date.asc(), Event.id.asc()).limit(page_size)).all()
+        if not page:
+            return
+        yield page
+        after = (page[-1].date, page[-1].id)
+
+
+def unclaimed(stale_before):
+    """Signups with no reminder sent and no live claim on one"""
+    return (EventVolunteer.reminder_sent_at.is_(None),
+            db.or_(EventVolunteer.reminder_claimed_at.is_(None), EventVolunteer.reminder_claimed_at < stale_before))
+
+
+def pending_signups(event_ids, batch_size, stale_before):
+    """Yield batches of signups on event_ids that have no reminder yet, with the volunteer's address"""
+    after = 0
+    while True:
+        batch = db.session.execute(
+            db.select(EventVolunteer.id, EventVolunteer.event_id, User.email, User.username)
+            .join(User, User.id == EventVolunteer.volunteer_id)
+            .where(EventVolunteer.event_id.in_(event_ids), *unclaimed(stale_before), EventVolunteer.id > after)
+            .order_by(EventVolunteer.id.asc()).limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        yield batch
+        after = batch[-1].id
+
+
+def claim(signup_ids, stamp, stale_before):
+    """Claim signups unless another live run holds them or already sent them; returns the ids this run now owns"""
+    claimed = db.session.execute(
+        db.update(EventVolunteer)
+        .where(EventVolunteer.id.in_(signup_ids), *unclaimed(stale_before))
+        .values(reminder_claimed_at=stamp)
+        .returning(EventVolunteer.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    return set(claimed)
+
+
+def settle(delivered, undelivered, stamp):
+    """Mark delivered reminders sent and clear the claim on the rest so the next run retries them"""
+    for signup_ids, values in ((delivered, {'reminder_sent_at': stamp}), (undelivered, {'reminder_claimed_at': None})):
+        if signup_ids:
+            db.session.execute(
+                db.update(EventVolunteer).where(EventVolunteer.id.in_(signup_ids)).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+    db.session.commit()
+
+
+def dispatch_reminders(hours=REMINDER_WINDOW_HOURS, batch_size=REMINDER_BATCH_SIZE, now=None,
+                       claim_timeout=REMINDER_CLAIM_TIMEOUT_MINUTES):
+    """Email every volunteer signed up for an event starting within `hours`, yielding a report per batch.
+    
+    Each batch is claimed before it is queued and waits for delivery before the next one starts, so at
+    most batch_size messages are in flight and reruns skip reminders that already went out. Claims
+    older than `claim_timeout` minutes were left by a run that died and are taken over.
+    """
+    now = now or datetime.utcnow()
+    end = now + timedelta(hours=hours)
+    stale_before = now - timedelta(minutes=claim_timeout)
+    number = 0
+    for events in upcoming_events(now, end):
+        events_by_id = {event.id: event for event in events}
+        for batch in pending_signups(list(events_by_id), batch_size, stale_before):
+            started = time.perf_counter()
+            number += 1
+            stamp = datetime.utcnow()
+            claimed = claim([signup.id for signup in batch], stamp, stale_before)
+            undelivered = []
+            
+            def record(signup_id, delivered):
+                # Runs on the mail worker thread; list.append is atomic
+                if not delivered:
+                    undelivered.append(signup_id)
+            
+            for signup in batch:
+                if signup.id not in claimed:
+                    continue
+                event = events_by_id[signup.event_id]
+                if not send_event_reminder_email(signup.email, signup.username, event, partial(record, signup.id)):
+                    undelivered.append(signup.id)
+            
+            mail_dispatcher.join()
+            settle(claimed.difference(undelivered), undelivered, datetime.utcnow())
+            yield {
+                'batch': number,
+                'claimed': len(claimed),
+                'skipped': len(batch) - len(claimed),
+                'sent': len(claimed) - len(undelivered),
+                'failed': len(undelivered),
+                'elapsed_seconds': round(time.perf_counter() - started, 3),
+            }
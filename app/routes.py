@@ -1,28 +1,163 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort, Response, stream_with_context, make_response, session, g, current_app
+from flask.globals import request_ctx
 from flask_login import login_required, current_user, login_user, logout_user
 from app import db
-from app.models import Event, User, EventVolunteer
+from app.models import Event, User, EventVolunteer, EventSeries
 from app.forms import EventForm
-import requests
-from datetime import datetime
+from app.weather import get_weather_forecast
+from app.email import mail_dispatcher
+from app.stats import admin_stats
+from app.user_cache import user_cache
+from app.passwords import HasherBusy
+from app.chatbot import generate_chatbot_response
+from app.page_cache import page_cache
+from app.live import live_hub, capacity_message
+from app.idempotency import idempotent
+from app.accounts import delete_user_account, delete_user_account_in_background
+from app.signups import batch_signup, batch_cancel, volunteer_ids_exist, CapacityChanged
+from app.admin_tables import user_table, event_table, user_activity, user_row, event_row, page_meta
+from app.search import event_search
+from app.geo import zip_centroids, CentroidsMissing, DEFAULT_RADIUS_MILES, MAX_RADIUS_MILES
+from app.imports import import_events, import_format
+from app.ical import feed_cutoff, feed_freshness, render_feed, feed_cache_key
+from app.series import (Occurrence, ListingPagination, occurrences_between, count_occurrences, series_window,
+                        sort_key, parse_occurrence, materialize, end_series)
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+import base64
+import heapq
+import hashlib
 import json
+import queue
 
 main = Blueprint('main', __name__)
 
-def get_weather_forecast(city):
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+NDJSON_BATCH_SIZE = 1000
+LIVE_MAX_STREAM_EVENTS = 50
+BATCH_MAX_ITEMS = 200
+
+def encode_cursor(item):
+    date, kind, item_id = sort_key(item)
+    suffix = '|series' if kind else ''
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{item_id}{suffix}".encode()).decode()
+
+def decode_cursor(cursor):
+    """The sort_key of the last item served; occurrences carry their series id instead of an event id"""
+    # binascii and unicode decoding errors are ValueErrors too
+    date_part, id_part, *kind = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    if kind not in ([], ['series']):
+        raise ValueError(cursor)
+    return datetime.fromisoformat(date_part), len(kind), int(id_part)
+
+# Results ranked by relevance or distance have no stable keyset, so their cursors carry an offset
+def encode_search_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode()
+
+def decode_search_cursor(cursor):
+    label, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    if label != 'offset' or int(offset) < 0:
+        raise ValueError(cursor)
+    return int(offset)
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def api_item(item, fields):
+    if isinstance(item, Occurrence):
+        return item.api_row(fields)
+    return Event.api_row(item, fields)
+
+def stream_ndjson(query, fields, occurrences=(), limit=None):
+    # yield_per streams from a server-side cursor so memory stays flat for full exports
+    rows = db.session.execute(query.execution_options(yield_per=NDJSON_BATCH_SIZE))
     try:
-        url = f"http://wttr.in/{city}?format=j1"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            current_condition = data['current_condition'][0]
-            return {
-                'temp': current_condition['temp_C'],
-                'desc': current_condition['weatherDesc'][0]['value'],
-                'humidity': current_condition['humidity']
-            }
-    except Exception:
+        for item in islice(heapq.merge(rows, occurrences, key=sort_key), limit):
+            yield json.dumps(api_item(item, fields)) + '\n'
+    finally:
+        rows.close()
+
+def not_modified(validators, last_modified=None):
+    """Return a 304 if the client's copy matches, else None.
+    
+    Pages render the navbar for the current user, so they are part of the ETag.
+    """
+    # A page that renders flashed messages must never be revalidated from the browser's copy
+    if '_flashes' in session:
+        g.validators = None
+        return None
+    
+    user_key = current_user.id if current_user.is_authenticated else None
+    etag = hashlib.sha1(repr((validators, user_key, request.full_path)).encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+    g.validators = (etag, last_modified)
+    
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    else:
+        matched = (last_modified is not None and request.if_modified_since is not None
+                   and last_modified <= request.if_modified_since)
+    if not matched:
         return None
+    
+    response = Response(status=304)
+    set_validators(response)
+    return response
+
+def set_validators(response):
+    response = make_response(response)
+    # Flashes can also be added and shown while this request renders
+    if g.validators is not None and not request_ctx.flashes:
+        etag, last_modified = g.validators
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def proximity_filter():
+    """(criteria, distance) for ?near=<zip>&radius=<miles>, or (None, None); raises ValueError on bad input"""
+    near = request.args.get('near', '').strip()
+    if not near:
+        return None, None
+    zip_centroids.require()
+    point = zip_centroids.lookup(near)
+    if point is None:
+        raise ValueError(f'Unknown ZIP code: {near}')
+    radius = request.args.get('radius', DEFAULT_RADIUS_MILES, type=float)
+    if not 0 < radius <= MAX_RADIUS_MILES:
+        raise ValueError(f'radius must be between 0 and {MAX_RADIUS_MILES} miles')
+    return Event.proximity(*point, radius)
+
+def listing_window(now):
+    """(start, end) from ?from=&to= as YYYY-MM-DD, end exclusive and None when open-ended"""
+    start, end = now, None
+    if request.args.get('from'):
+        start = max(now, datetime.strptime(request.args['from'], '%Y-%m-%d'))
+    if request.args.get('to'):
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1)
+    return start, end
+
+def listing_freshness(now):
+    """Validators and Last-Modified for listings that include recurring series"""
+    last_modified, count, signups = Event.freshness(Event.date >= now)
+    series_modified, series_count = EventSeries.freshness()
+    # Occurrences drop off as they pass and enter as the horizon moves, without any row changing
+    upcoming = count_occurrences(*series_window(now)) if series_count else 0
+    latest = max((value for value in (last_modified, series_modified) if value), default=None)
+    return (count, signups, last_modified, series_count, series_modified, upcoming), latest
+
+@main.app_template_global()
+def event_url(event):
+    if isinstance(event, Occurrence):
+        return url_for('main.series_occurrence', series_id=event.series_id, occurrence=event.key)
+    return url_for('main.event_detail', event_id=event.id)
 
 def get_map_embed_url(address):
     address_clean = address.replace(' ', '+')
@@ -35,8 +170,53 @@ def index():
 @main.route('/events')
 def events():
     page = request.args.get('page', 1, type=int)
-    events = Event.query.filter(Event.date >= datetime.utcnow()).order_by(Event.date.asc()).paginate(page=page, per_page=6)
-    return render_template('events.html', events=events)
+    filters = {name: request.args[name].strip() for name in ('q', 'near', 'radius', 'from', 'to')
+               if request.args.get(name, '').strip()}
+    
+    now = datetime.utcnow()
+    validators, last_modified = listing_freshness(now)
+    cached = not_modified(validators, last_modified)
+    if cached:
+        return cached
+    
+    try:
+        nearby, distance = proximity_filter()
+        start, end = listing_window(now)
+    except CentroidsMissing as e:
+        current_app.logger.error('%s', e)
+        flash('Searching near a ZIP code is not available right now.', 'warning')
+        return redirect(url_for('main.events', q=filters.get('q')))
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('main.events', q=filters.get('q')))
+    
+    query = Event.listing_query().filter(Event.date >= start)
+    if end:
+        query = query.filter(Event.date < end)
+    
+    matches = event_search.matches(filters.get('q', ''))
+    if matches is not None or nearby:
+        # Search and proximity cover stored events only; series occurrences have no row to index
+        order = []
+        if matches is not None:
+            query = query.join(matches, matches.c.event_id == Event.id)
+            order.append(matches.c.rank.desc())
+        if nearby:
+            query = query.filter(*nearby)
+            order.append(distance.asc())
+        events = query.order_by(*order, Event.id.asc()).paginate(page=page, per_page=6)
+        return set_validators(render_template('events.html', events=events, filters=filters))
+    
+    def build():
+        series_start, series_end = series_window(start, end)
+        events = ListingPagination(page=page, per_page=6, query=query, start=series_start, end=series_end)
+        return render_template('events.html', events=events, filters=filters)
+    
+    # Only the unfiltered listing is shared through the page cache: the page echoes its filters back,
+    # and arbitrary date windows would only evict the listing pages
+    if filters:
+        return set_validators(build())
+    return set_validators(page_cache.render(f'events:{page}', ('events',), build))
 
 @main.route('/events/create', methods=['GET', 'POST'])
 @login_required
@@ -62,24 +242,42 @@ def create_event():
                 flash('Maximum volunteers must be at least 1.', 'error')
                 return render_template('create_event.html', form=form, min_date=min_date)
             
-            event = Event(
-                title=form.title.data,
-                description=form.description.data,
-                date=event_date,
-                address=form.address.data,
-                city=form.city.data,
-                state=form.state.data,
-                zip_code=form.zip_code.data,
-                max_volunteers=form.max_volunteers.data,
-                organizer_id=current_user.id
-            )
+            if form.repeats.data:
+                # A series stores the rule once; occurrences only get rows when someone signs up
+                until = form.repeat_until.data
+                event = EventSeries(
+                    title=form.title.data,
+                    description=form.description.data,
+                    starts_at=event_date,
+                    frequency=form.repeats.data,
+                    until=datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1, microseconds=-1) if until else None,
+                    address=form.address.data,
+                    city=form.city.data,
+                    state=form.state.data,
+                    zip_code=form.zip_code.data,
+                    max_volunteers=form.max_volunteers.data,
+                    organizer_id=current_user.id
+                )
+            else:
+                event = Event(
+                    title=form.title.data,
+                    description=form.description.data,
+                    date=event_date,
+                    address=form.address.data,
+                    city=form.city.data,
+                    state=form.state.data,
+                    zip_code=form.zip_code.data,
+                    max_volunteers=form.max_volunteers.data,
+                    organizer_id=current_user.id
+                )
             
             db.session.add(event)
             db.session.commit()
+            page_cache.invalidate_event()
             
             flash('Event created successfully!', 'success')
             return redirect(url_for('main.dashboard'))
-            
+        
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating event: {str(e)}', 'error')
@@ -91,43 +289,166 @@ def create_event():
 
 @main.route('/events/<int:event_id>')
 def event_detail(event_id):
-    event = Event.query.get_or_404(event_id)
-    weather = get_weather_forecast(event.city)
-    map_url = get_map_embed_url(event.get_full_address())
-    is_signed_up = False
-    
-    if current_user.is_authenticated and current_user.user_type == 'volunteer':
-        is_signed_up = EventVolunteer.query.filter_by(
-            event_id=event_id, 
-            volunteer_id=current_user.id
-        ).first() is not None
-    
-    return render_template('event_detail.html', 
-                         event=event, 
-                         weather=weather, 
-                         map_url=map_url,
-                         is_signed_up=is_signed_up)
+    state = db.session.execute(
+        db.select(Event.updated_at, Event.created_at, Event.signup_count, Event.city).where(Event.id == event_id)
+    ).first()
+    if state is None:
+        abort(404)
+    
+    # The page shows the forecast too, which is served from the weather cache
+    last_modified = state.updated_at or state.created_at
+    cached = not_modified((last_modified, state.signup_count, get_weather_forecast(state.city)), last_modified)
+    if cached:
+        return cached
+    
+    def build():
+        event = Event.query.get_or_404(event_id)
+        weather = get_weather_forecast(event.city)
+        map_url = get_map_embed_url(event.get_full_address())
+        is_signed_up = False
+        
+        if current_user.is_authenticated and current_user.user_type == 'volunteer':
+            is_signed_up = EventVolunteer.query.filter_by(
+                event_id=event_id, 
+                volunteer_id=current_user.id
+            ).first() is not None
+        
+        return render_template('event_detail.html', 
+                             event=event, 
+                             weather=weather, 
+                             map_url=map_url,
+                             is_signed_up=is_signed_up,
+                             signup_url=url_for('main.api_volunteer_signup', event_id=event_id))
+    
+    return set_validators(page_cache.render(f'event:{event_id}', (f'event:{event_id}',), build))
+
+@main.route('/series/<int:series_id>/<occurrence>')
+def series_occurrence(series_id, occurrence):
+    series = EventSeries.query.get_or_404(series_id)
+    date = parse_occurrence(series, occurrence)
+    if date is None:
+        abort(404)
+    
+    # Occurrences with signups have their own Event row and page
+    event_id = db.session.execute(
+        db.select(Event.id).where(Event.series_id == series_id, Event.date == date)
+    ).scalar()
+    if event_id is not None:
+        return redirect(url_for('main.event_detail', event_id=event_id))
+    
+    event = Occurrence(series, date)
+    return render_template('event_detail.html',
+                         event=event,
+                         weather=get_weather_forecast(event.city),
+                         map_url=get_map_embed_url(event.get_full_address()),
+                         is_signed_up=False,
+                         signup_url=url_for('main.api_series_signup', series_id=series_id, occurrence=occurrence))
 
 # API Routes
 @main.route('/api/events', methods=['GET'])
 def api_get_events():
-    events = Event.query.filter(Event.date >= datetime.utcnow()).all()
-    events_data = []
-    for event in events:
-        events_data.append({
-            'id': event.id,
-            'title': event.title,
-            'description': event.description,
-            'date': event.date.isoformat(),
-            'location': event.get_full_address(),
-            'organizer': event.organizer.username,
-            'volunteers_count': event.volunteers_count(),
-            'max_volunteers': event.max_volunteers
-        })
-    return jsonify(events_data)
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    fields = fields or list(Event.API_FIELDS)
+    unknown = [field for field in fields if field not in Event.API_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    now = datetime.utcnow()
+    validators, last_modified = listing_freshness(now)
+    cached = not_modified(validators + (request.accept_mimetypes.best,), last_modified)
+    if cached:
+        return cached
+    
+    try:
+        nearby, distance = proximity_filter()
+        start, end = listing_window(now)
+    except CentroidsMissing as e:
+        current_app.logger.error('%s', e)
+        return jsonify({'error': 'Proximity search is not available: ZIP centroid data is not installed'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = Event.api_select(fields).where(Event.date >= start)
+    if end:
+        query = query.where(Event.date < end)
+    
+    ranking = []
+    matches = event_search.matches(request.args.get('q', ''))
+    if matches is not None:
+        query = query.join(matches, matches.c.event_id == Event.id)
+        ranking.append(matches.c.rank.desc())
+    if nearby:
+        query = query.where(*nearby)
+        ranking.append(distance.asc())
+    if ranking:
+        return api_ranked_events(query.order_by(None).order_by(*ranking, Event.id.asc()), fields)
+    
+    # Stored events and unmaterialized series occurrences merge on (date, kind, id)
+    series_start, series_end = series_window(start, end)
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        after_date, after_kind, after_id = after
+        if after_kind:
+            query = query.where(Event.date > after_date)
+        else:
+            query = query.where(db.tuple_(Event.date, Event.id) > (after_date, after_id))
+        series_start = max(series_start, after_date)
+    occurrences = occurrences_between(series_start, series_end, after=after)
+    
+    if wants_ndjson():
+        limit = max(request.args.get('limit', 1, type=int), 1) if 'limit' in request.args else None
+        return set_validators(Response(stream_with_context(stream_ndjson(query, fields, occurrences, limit)),
+                                       mimetype='application/x-ndjson'))
+    
+    limit = min(max(request.args.get('limit', API_PAGE_SIZE, type=int), 1), API_MAX_PAGE_SIZE)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    items = list(islice(heapq.merge(rows, occurrences, key=sort_key), limit + 1))
+    response = jsonify([api_item(item, fields) for item in items[:limit]])
+    
+    if len(items) > limit:
+        next_cursor = encode_cursor(items[limit - 1])
+        next_url = url_for('main.api_get_events', **dict(request.args.to_dict(), cursor=next_cursor, limit=limit),
+                           _external=True)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return set_validators(response)
+
+def api_ranked_events(query, fields):
+    """/api/events results ordered by search rank or distance, paged with offset cursors"""
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            offset = decode_search_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    query = query.offset(offset)
+    
+    if wants_ndjson():
+        limit = max(request.args.get('limit', 1, type=int), 1) if 'limit' in request.args else None
+        return set_validators(Response(stream_with_context(stream_ndjson(query, fields, limit=limit)),
+                                       mimetype='application/x-ndjson'))
+    
+    limit = min(max(request.args.get('limit', API_PAGE_SIZE, type=int), 1), API_MAX_PAGE_SIZE)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    response = jsonify([Event.api_row(row, fields) for row in rows[:limit]])
+    
+    if len(rows) > limit:
+        next_cursor = encode_search_cursor(offset + limit)
+        next_url = url_for('main.api_get_events', **dict(request.args.to_dict(), cursor=next_cursor, limit=limit),
+                           _external=True)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return set_validators(response)
 
 @main.route('/api/events', methods=['POST'])
 @login_required
+@idempotent
 def api_create_event():
     if current_user.user_type != 'organization':
         return jsonify({'error': 'Only organizations can create events'}), 403
@@ -146,56 +467,324 @@ def api_create_event():
     )
     db.session.add(event)
     db.session.commit()
+    page_cache.invalidate_event()
     return jsonify({'message': 'Event created successfully', 'event_id': event.id}), 201
 
-@main.route('/api/events/<int:event_id>/volunteer', methods=['POST'])
+@main.route('/api/events/import', methods=['POST'])
 @login_required
-def api_volunteer_signup(event_id):
-    if current_user.user_type != 'volunteer':
-        return jsonify({'error': 'Only volunteers can sign up for events'}), 403
+def api_import_events():
+    if current_user.user_type != 'organization':
+        return jsonify({'error': 'Only organizations can create events'}), 403
     
-    event = Event.query.get_or_404(event_id)
+    # Either a multipart upload in "file" or the raw CSV/NDJSON body, read as a stream
+    upload = request.files.get('file')
+    if upload:
+        stream, fmt = upload.stream, import_format(upload.mimetype, upload.filename or '')
+    else:
+        stream, fmt = request.stream, import_format(request.mimetype)
+    fmt = request.args.get('format', fmt)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Send text/csv or application/x-ndjson, or pass format=csv|ndjson'}), 415
     
-    existing_signup = EventVolunteer.query.filter_by(
-        event_id=event_id, 
-        volunteer_id=current_user.id
-    ).first()
+    return jsonify(import_events(stream, fmt, current_user.id))
+
+@main.route('/api/series', methods=['POST'])
+@login_required
+@idempotent
+def api_create_series():
+    if current_user.user_type != 'organization':
+        return jsonify({'error': 'Only organizations can create events'}), 403
     
-    if existing_signup:
-        return jsonify({'error': 'Already signed up for this event'}), 400
+    data = request.get_json()
+    frequency = data.get('frequency', 'weekly')
+    if frequency not in EventSeries.FREQUENCIES:
+        return jsonify({'error': f'frequency must be one of: {", ".join(EventSeries.FREQUENCIES)}'}), 400
+    try:
+        interval = int(data.get('interval', 1))
+        # Occurrence keys have minute precision, so seconds would make every occurrence unreachable
+        starts_at = datetime.fromisoformat(data['date']).replace(second=0, microsecond=0)
+        until = datetime.fromisoformat(data['until']).replace(second=0, microsecond=0) if data.get('until') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'date and until must be ISO dates and interval a whole number'}), 400
+    if interval < 1 or (until is not None and until < starts_at):
+        return jsonify({'error': 'interval must be at least 1 and until must not be before date'}), 400
     
-    if event.volunteers_count() >= event.max_volunteers:
-        return jsonify({'error': 'Event is full'}), 400
+    series = EventSeries(
+        title=data['title'],
+        description=data['description'],
+        starts_at=starts_at,
+        frequency=frequency,
+        interval=interval,
+        until=until,
+        address=data['address'],
+        city=data['city'],
+        state=data['state'],
+        zip_code=data['zip_code'],
+        max_volunteers=data.get('max_volunteers', 10),
+        organizer_id=current_user.id
+    )
+    db.session.add(series)
+    db.session.commit()
+    page_cache.invalidate_event()
+    return jsonify({'message': 'Series created successfully', 'series_id': series.id}), 201
+
+@main.route('/api/series/<int:series_id>/end', methods=['POST'])
+@login_required
+def api_end_series(series_id):
+    series = EventSeries.query.get_or_404(series_id)
+    if not series.can_edit(current_user):
+        return jsonify({'error': 'Only the organizer can end this series'}), 403
     
-    signup = EventVolunteer(event_id=event_id, volunteer_id=current_user.id)
-    db.session.add(signup)
+    kept = end_series(series)
     db.session.commit()
+    page_cache.invalidate_all()
+    return jsonify({'message': 'Series ended', 'kept_events': kept})
+
+def volunteer_signup(event_id):
+    """Reserve a spot on a stored event for the current volunteer"""
+    if not Event.reserve_spot(event_id):
+        db.session.rollback()
+        Event.query.get_or_404(event_id)
+        if EventVolunteer.query.filter_by(event_id=event_id, volunteer_id=current_user.id).first():
+            return jsonify({'error': 'Already signed up for this event'}), 400
+        return jsonify({'error': 'Event is full'}), 400
+    
+    try:
+        db.session.add(EventVolunteer(event_id=event_id, volunteer_id=current_user.id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Already signed up for this event'}), 400
     
-    return jsonify({'message': 'Successfully signed up for event'}), 201
+    page_cache.invalidate_event(event_id)
+    live_hub.notify(event_id)
+    return jsonify({'message': 'Successfully signed up for event', 'event_id': event_id}), 201
+
+@main.route('/api/events/<int:event_id>/volunteer', methods=['POST'])
+@login_required
+@idempotent
+def api_volunteer_signup(event_id):
+    if current_user.user_type != 'volunteer':
+        return jsonify({'error': 'Only volunteers can sign up for events'}), 403
+    return volunteer_signup(event_id)
+
+@main.route('/api/series/<int:series_id>/occurrences/<occurrence>/volunteer', methods=['POST'])
+@login_required
+@idempotent
+def api_series_signup(series_id, occurrence):
+    if current_user.user_type != 'volunteer':
+        return jsonify({'error': 'Only volunteers can sign up for events'}), 403
+    
+    series = EventSeries.query.get_or_404(series_id)
+    date = parse_occurrence(series, occurrence)
+    if date is None:
+        abort(404)
+    if date < datetime.utcnow():
+        return jsonify({'error': 'This occurrence has already taken place'}), 400
+    
+    # The first signup stores the occurrence as an Event; later ones find it
+    event_id = materialize(series, date).id
+    db.session.commit()
+    return volunteer_signup(event_id)
 
 @main.route('/api/events/<int:event_id>/volunteer', methods=['DELETE'])
 @login_required
 def api_volunteer_cancel(event_id):
-    signup = EventVolunteer.query.filter_by(
+    deleted = EventVolunteer.query.filter_by(
         event_id=event_id, 
         volunteer_id=current_user.id
-    ).first_or_404()
+    ).delete(synchronize_session=False)
     
-    db.session.delete(signup)
+    if not deleted:
+        abort(404)
+    
+    Event.release_spots([event_id])
     db.session.commit()
+    page_cache.invalidate_event(event_id)
+    live_hub.notify(event_id)
     
     return jsonify({'message': 'Successfully canceled event signup'}), 200
 
+def parse_batch_request():
+    """Validate a batch body; returns (event_ids, volunteer_ids, error response)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        if not isinstance(data.get('event_ids', []), list) or not isinstance(data.get('volunteer_ids', []), list):
+            raise TypeError
+        event_ids = list(dict.fromkeys(int(event_id) for event_id in data.get('event_ids', [])))
+        volunteer_ids = list(dict.fromkeys(int(volunteer_id) for volunteer_id in data.get('volunteer_ids', [])))
+    except (TypeError, ValueError):
+        return None, None, (jsonify({'error': 'event_ids and volunteer_ids must be lists of ids'}), 400)
+    
+    if volunteer_ids and not current_user.is_admin:
+        return None, None, (jsonify({'error': 'Only admins can act for other volunteers'}), 403)
+    if not volunteer_ids:
+        if current_user.user_type != 'volunteer':
+            return None, None, (jsonify({'error': 'Only volunteers can sign up for events'}), 403)
+        volunteer_ids = [current_user.id]
+    elif not volunteer_ids_exist(volunteer_ids):
+        return None, None, (jsonify({'error': 'Every volunteer_id must belong to a volunteer account'}), 400)
+    
+    if not event_ids or len(event_ids) * len(volunteer_ids) > BATCH_MAX_ITEMS:
+        return None, None, (jsonify({'error': f'A batch must cover between 1 and {BATCH_MAX_ITEMS} signups'}), 400)
+    return event_ids, volunteer_ids, None
+
+def batch_changed(results, done_status):
+    changed = {result['event_id'] for result in results if result['status'] == done_status}
+    for event_id in changed:
+        page_cache.invalidate_event(event_id)
+        live_hub.notify(event_id)
+
+@main.route('/api/events/volunteers/batch', methods=['POST'])
+@login_required
+@idempotent
+def api_batch_signup():
+    event_ids, volunteer_ids, error = parse_batch_request()
+    if error:
+        return error
+    
+    try:
+        results = batch_signup(event_ids, volunteer_ids)
+        db.session.commit()
+    except (CapacityChanged, IntegrityError):
+        db.session.rollback()
+        return jsonify({'error': 'Signups changed while processing the batch, please retry'}), 409
+    
+    batch_changed(results, 'signed_up')
+    return jsonify({'results': results})
+
+@main.route('/api/events/volunteers/batch', methods=['DELETE'])
+@login_required
+def api_batch_cancel():
+    event_ids, volunteer_ids, error = parse_batch_request()
+    if error:
+        return error
+    
+    results = batch_cancel(event_ids, volunteer_ids)
+    db.session.commit()
+    
+    batch_changed(results, 'canceled')
+    return jsonify({'results': results})
+
+def capacity_stream(event_ids):
+    rows = db.session.execute(
+        db.select(Event.id, Event.signup_count, Event.max_volunteers).where(Event.id.in_(event_ids))
+    ).all()
+    if not rows:
+        abort(404)
+    
+    subscriber = live_hub.subscribe({row.id: (row.signup_count, row.max_volunteers) for row in rows})
+    if subscriber is None:
+        return jsonify({'error': 'Too many live connections, try again later'}), 503
+    
+    initial = ''.join(capacity_message(row.id, row.signup_count, row.max_volunteers) for row in rows)
+    
+    # Deliberately not wrapped in stream_with_context: the stream holds no database connection
+    def generate():
+        try:
+            yield 'retry: 5000\n\n' + initial
+            while True:
+                try:
+                    message = subscriber.queue.get(timeout=live_hub.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            live_hub.unsubscribe(subscriber)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_stream_ids():
+    """Event ids from ?ids=1,2,3; raises ValueError unless there are 1 to LIVE_MAX_STREAM_EVENTS of them"""
+    try:
+        event_ids = {int(event_id) for event_id in request.args.get('ids', '').split(',') if event_id}
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of event ids')
+    if not event_ids or len(event_ids) > LIVE_MAX_STREAM_EVENTS:
+        raise ValueError(f'Provide between 1 and {LIVE_MAX_STREAM_EVENTS} event ids')
+    return event_ids
+
+@main.route('/api/events/capacity')
+def api_events_capacity():
+    """Polling fallback for clients that cannot hold a live stream open"""
+    try:
+        event_ids = parse_stream_ids()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = db.session.execute(
+        db.select(Event.id, Event.signup_count, Event.max_volunteers).where(Event.id.in_(event_ids))
+    ).all()
+    return jsonify([{
+        'event_id': row.id,
+        'volunteers_count': row.signup_count,
+        'max_volunteers': row.max_volunteers,
+        'spots_remaining': row.max_volunteers - row.signup_count,
+    } for row in rows])
+
+@main.route('/api/events/<int:event_id>/stream')
+def api_event_stream(event_id):
+    return capacity_stream([event_id])
+
+@main.route('/api/events/stream')
+def api_events_stream():
+    try:
+        event_ids = parse_stream_ids()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return capacity_stream(event_ids)
+
 @main.route('/dashboard')
 @login_required
 def dashboard():
     if current_user.user_type == 'organization':
-        events = Event.query.filter_by(organizer_id=current_user.id).all()
-        return render_template('dashboard.html', events=events, now=datetime.utcnow())
+        now = datetime.utcnow()
+        events = Event.listing_query().filter_by(organizer_id=current_user.id).all()
+        occurrences = occurrences_between(*series_window(now), criteria=[EventSeries.organizer_id == current_user.id])
+        events = sorted([*events, *occurrences], key=sort_key)
+        return render_template('dashboard.html', events=events, now=now, feed_url=calendar_feed_url())
     else:
-        signups = EventVolunteer.query.filter_by(volunteer_id=current_user.id).all()
-        events = [signup.event for signup in signups]
-        return render_template('dashboard.html', events=events, now=datetime.utcnow())
+        events = Event.listing_query().join(
+            EventVolunteer, EventVolunteer.event_id == Event.id
+        ).filter(EventVolunteer.volunteer_id == current_user.id).order_by(EventVolunteer.id).all()
+        return render_template('dashboard.html', events=events, now=datetime.utcnow(), feed_url=calendar_feed_url())
+
+def calendar_feed_url():
+    token = db.session.get(User, current_user.id).calendar_feed_token()
+    return url_for('main.calendar_feed', token=token, _external=True)
+
+@main.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    """Subscribable feed of a volunteer's signups or an organization's events; the token is the only credential"""
+    user = User.query.filter_by(calendar_token=token).first()
+    if user is None:
+        abort(404)
+    
+    # Calendar apps poll often: answer from aggregates with a 304, and rebuild the body only when it changed
+    cutoff = feed_cutoff()
+    validators, last_modified = feed_freshness(user, cutoff)
+    cached = not_modified(validators, last_modified)
+    if cached:
+        return cached
+    
+    body = page_cache.fetch(feed_cache_key(user, request.host, validators),
+                            lambda: render_feed(user, request.host, cutoff),
+                            current_app.config.get('FEED_CACHE_TTL', 86400))
+    response = Response(body, mimetype='text/calendar')
+    response.headers['Content-Disposition'] = 'inline; filename="community-connect.ics"'
+    return set_validators(response)
+
+@main.route('/calendar/reset', methods=['POST'])
+@login_required
+def reset_calendar_feed():
+    db.session.get(User, current_user.id).reset_calendar_token()
+    flash('Your calendar link was replaced. Subscribe again with the new link.', 'success')
+    return redirect(url_for('main.dashboard'))
 
 # ADMIN ROUTES
 @main.route('/admin', methods=['GET', 'POST'])
@@ -213,7 +802,13 @@ def admin_login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            authenticated = user is not None and user.check_password(password)
+        except HasherBusy:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('admin_login.html'), 503
+        
+        if authenticated:
             if user.is_admin:
                 login_user(user)
                 flash('Admin login successful!', 'success')
@@ -232,18 +827,11 @@ def admin_dashboard():
         flash('Admin access required.', 'error')
         return redirect(url_for('main.admin_login'))
     
-    total_users = User.query.count()
-    total_events = Event.query.count()
-    total_volunteers = User.query.filter_by(user_type='volunteer').count()
-    total_organizations = User.query.filter_by(user_type='organization').count()
     recent_signups = User.query.order_by(User.created_at.desc()).limit(5).all()
     
     return render_template('admin_dashboard.html',
-                         total_users=total_users,
-                         total_events=total_events,
-                         total_volunteers=total_volunteers,
-                         total_organizations=total_organizations,
-                         recent_signups=recent_signups)
+                         recent_signups=recent_signups,
+                         **admin_stats.get())
 
 @main.route('/admin/logout')
 @login_required
@@ -259,8 +847,18 @@ def admin_users():
         flash('Admin access required', 'error')
         return redirect(url_for('main.admin_login'))
     
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
+    try:
+        params = user_table.params(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.admin_users'))
+    
+    users = user_table.page(params)
+    return render_template('admin_users.html',
+                         users=users,
+                         activity=user_activity([user.id for user in users.items]),
+                         params=params,
+                         **admin_stats.get())
 
 @main.route('/admin/events')
 @login_required
@@ -269,10 +867,45 @@ def admin_events():
         flash('Admin access required', 'error')
         return redirect(url_for('main.admin_login'))
     
-    events = Event.query.order_by(Event.date.asc()).all()
-    return render_template('admin_events.html', events=events)
+    try:
+        params = event_table.params(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.admin_events'))
+    
+    events = event_table.page(params)
+    return render_template('admin_events.html', events=events, params=params)
 
 # ADMIN API ROUTES
+@main.route('/api/admin/users')
+@login_required
+def api_admin_users():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        params = user_table.params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    users = user_table.page(params)
+    activity = user_activity([user.id for user in users.items])
+    return jsonify(dict(page_meta(users), users=[user_row(user, activity[user.id]) for user in users.items]))
+
+@main.route('/api/admin/events')
+@login_required
+def api_admin_events():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        params = event_table.params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    events = event_table.page(params)
+    return jsonify(dict(page_meta(events), events=[event_row(event) for event in events.items]))
+
 @main.route('/api/admin/user/<int:user_id>/toggle-admin', methods=['POST'])
 @login_required
 def api_toggle_admin(user_id):
@@ -282,6 +915,7 @@ def api_toggle_admin(user_id):
     user = User.query.get_or_404(user_id)
     user.is_admin = not user.is_admin
     db.session.commit()
+    user_cache.invalidate(user_id)
     
     return jsonify({
         'message': f'Admin status updated for {user.username}',
@@ -298,14 +932,34 @@ def api_delete_user(user_id):
         return jsonify({'error': 'Cannot delete your own account'}), 400
     
     user = User.query.get_or_404(user_id)
+    username = user.username
     
-    Event.query.filter_by(organizer_id=user_id).delete()
-    EventVolunteer.query.filter_by(volunteer_id=user_id).delete()
+    if request.args.get('background') in ('1', 'true'):
+        delete_user_account_in_background(user_id)
+        return jsonify({'message': f'Deletion of user {username} started'}), 202
     
-    db.session.delete(user)
-    db.session.commit()
+    report = delete_user_account(user_id)
+    user_cache.invalidate(user_id)
+    page_cache.invalidate_all()
+    admin_stats.invalidate()
     
-    return jsonify({'message': f'User {user.username} deleted successfully'})
+    return jsonify(dict(report, message=f'User {username} deleted successfully'))
+
+@main.route('/api/admin/mail/metrics')
+@login_required
+def api_mail_metrics():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify(mail_dispatcher.metrics())
+
+@main.route('/api/admin/live/metrics')
+@login_required
+def api_live_metrics():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify(live_hub.metrics())
 
 # CHATBOT
 @main.route('/api/chatbot', methods=['POST'])
@@ -318,37 +972,10 @@ def chatbot():
             'response': response,
             'timestamp': datetime.utcnow().isoformat()
         })
-        
+    
     except Exception:
         return jsonify({'error': 'Chatbot unavailable'}), 500
 
-def generate_chatbot_response(message):
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ['hello', 'hi', 'hey']):
-        return "Hello! I'm your volunteer assistant. How can I help you with volunteering today?"
-    
-    elif any(word in message_lower for word in ['event', 'opportunity']):
-        return "You can browse all available events on the Events page. Organizations post events where they need volunteers like you!"
-    
-    elif any(word in message_lower for word in ['sign up', 'register', 'join']):
-        return "To sign up for an event, just go to the event details page and click 'Sign Up as Volunteer'. You need to be logged in first!"
-    
-    elif any(word in message_lower for word in ['create', 'organize', 'host']):
-        return "To create an event, you need an organization account. Register as an organization to post volunteer opportunities!"
-    
-    elif any(word in message_lower for word in ['weather', 'rain', 'sunny']):
-        return "I check weather for each event! Visit any event page to see weather forecasts and preparation tips."
-    
-    elif any(word in message_lower for word in ['cancel', 'remove']):
-        return "To cancel your volunteer signup, go to your Dashboard and click 'Cancel' next to the event."
-    
-    elif any(word in message_lower for word in ['help', 'support']):
-        return "I can help you with: finding events, signing up, event creation, weather info, and account questions. What do you need?"
-    
-    else:
-        return "I'm here to help with volunteering! You can ask me about events, signing up, creating events, or weather information. What would you like to know?"
-
 # EVENT MANAGEMENT
 @main.route('/events/<int:event_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -372,10 +999,16 @@ def edit_event(event_id):
         form.max_volunteers.data = event.max_volunteers
     
     if form.validate_on_submit():
+        date = datetime.strptime(form.date.data, '%Y-%m-%dT%H:%M')
+        if event.series_id is not None and date != event.date:
+            # Moving it would leave the series to list the original date again
+            flash('The date of a recurring series occurrence cannot be changed.', 'error')
+            return render_template('edit_event.html', form=form, event=event)
+        
         try:
             event.title = form.title.data
             event.description = form.description.data
-            event.date = datetime.strptime(form.date.data, '%Y-%m-%dT%H:%M')
+            event.date = date
             event.address = form.address.data
             event.city = form.city.data
             event.state = form.state.data
@@ -383,9 +1016,11 @@ def edit_event(event_id):
             event.max_volunteers = form.max_volunteers.data
             
             db.session.commit()
+            page_cache.invalidate_event(event.id)
+            live_hub.notify(event.id)
             flash('Event updated successfully!', 'success')
             return redirect(url_for('main.event_detail', event_id=event.id))
-            
+        
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating event: {str(e)}', 'error')
@@ -401,11 +1036,18 @@ def delete_event(event_id):
         flash('You do not have permission to delete this event.', 'error')
         return redirect(url_for('main.event_detail', event_id=event_id))
     
+    if event.series_id is not None:
+        # The series would list the date again as a fresh occurrence, and its signups would be gone
+        flash('This date belongs to a recurring series and cannot be deleted on its own. '
+              'End the series to stop further dates.', 'warning')
+        return redirect(url_for('main.event_detail', event_id=event_id))
+    
     try:
         db.session.delete(event)
         db.session.commit()
+        page_cache.invalidate_event(event_id)
         flash('Event deleted successfully!', 'success')
-        
+    
     except Exception as e:
         db.session.rollback()
         flash(f'Error deleting event: {str(e)}', 'error')
@@ -413,4 +1055,22 @@ def delete_event(event_id):
     if current_user.user_type == 'organization':
         return redirect(url_for('main.dashboard'))
     else:
-        return redirect(url_for('main.events'))
\ No newline at end of file
+        return redirect(url_for('main.events'))
+
+@main.route('/series/<int:series_id>/end', methods=['POST'])
+@login_required
+def end_event_series(series_id):
+    series = EventSeries.query.get_or_404(series_id)
+    
+    if not series.can_edit(current_user):
+        flash('You do not have permission to end this series.', 'error')
+        return redirect(url_for('main.events'))
+    
+    kept = end_series(series)
+    db.session.commit()
+    page_cache.invalidate_all()
+    if kept:
+        flash(f'Series ended. {kept} upcoming occurrence(s) with signups were kept as separate events.', 'success')
+    else:
+        flash('Series ended.', 'success')
+    return redirect(url_for('main.dashboard'))
\ No newline at end of file
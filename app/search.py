@@ -0,0 +1,111 @@
+import re
+from sqlalchemy import inspect, text
+from app import db
+from app.models import Event
+
+SEARCH_CONFIG = 'english'
+
+# Stored generated column: Postgres keeps it current on every write, including set-based ones
+POSTGRES_DDL = [
+    f"""ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(city, '') || ' ' || coalesce(state, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_events_search_vector ON events USING GIN (search_vector)',
+]
+
+# External-content FTS5 table over events, kept in sync by triggers so bulk statements are covered too
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        title, description, city, state, content='events', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts (rowid, title, description, city, state)
+        VALUES (new.id, new.title, new.description, new.city, new.state);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, title, description, city, state)
+        VALUES ('delete', old.id, old.title, old.description, old.city, old.state);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description, city, state ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, title, description, city, state)
+        VALUES ('delete', old.id, old.title, old.description, old.city, old.state);
+        INSERT INTO events_fts (rowid, title, description, city, state)
+        VALUES (new.id, new.title, new.description, new.city, new.state);
+    END""",
+]
+
+# bm25 column weights for title, description, city, state
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+
+def search_terms(q):
+    return re.findall(r'\w+', q.lower())[:16]
+
+
+class EventSearch:
+    """Ranked full-text search over event title, description, city and state"""
+    
+    def __init__(self):
+        self._installed = set()
+    
+    def install(self):
+        """Create the search column or table, its index and sync triggers; safe to rerun"""
+        statements = {'postgresql': POSTGRES_DDL, 'sqlite': SQLITE_DDL}.get(db.engine.dialect.name, [])
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+        self._installed.discard(str(db.engine.url))
+    
+    def rebuild(self):
+        """Reindex every event; only needed on SQLite after the table was created over existing rows"""
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text("INSERT INTO events_fts (events_fts) VALUES ('rebuild')"))
+            db.session.commit()
+    
+    def installed(self):
+        key = str(db.engine.url)
+        if key in self._installed:
+            return True
+        
+        # Only a positive answer is cached, so `flask upgrade-db` run from another process is picked up
+        inspector = inspect(db.engine)
+        if db.engine.dialect.name == 'postgresql':
+            found = 'search_vector' in {c['name'] for c in inspector.get_columns('events')}
+        else:
+            found = inspector.has_table('events_fts')
+        if found:
+            self._installed.add(key)
+        return found
+    
+    def matches(self, q):
+        """Subquery of (event_id, rank) for events matching q, higher rank first; None if q has no terms"""
+        terms = search_terms(q)
+        if not terms:
+            return None
+        
+        if not self.installed():
+            # Unindexed fallback until `flask upgrade-db` has been run
+            columns = (Event.title, Event.description, Event.city, Event.state)
+            return db.select(Event.id.label('event_id'), db.literal(0.0).label('rank')).where(*[
+                db.or_(*(column.ilike(f'%{term}%') for column in columns)) for term in terms
+            ]).subquery()
+        
+        if db.engine.dialect.name == 'postgresql':
+            vector = db.literal_column('events.search_vector')
+            query = db.func.websearch_to_tsquery(SEARCH_CONFIG, q)
+            return db.select(
+                Event.id.label('event_id'), db.func.ts_rank_cd(vector, query).label('rank')
+            ).where(vector.op('@@')(query)).subquery()
+        
+        # Quote every term so user input can never be parsed as FTS5 syntax; the last one matches as a prefix
+        expression = ' '.join(f'"{term}"' for term in terms) + '*'
+        fts = db.table('events_fts', db.column('rowid'))
+        table = db.literal_column('events_fts')
+        return db.select(
+            fts.c.rowid.label('event_id'), (-db.func.bm25(table, *SQLITE_WEIGHTS)).label('rank')
+        ).select_from(fts).where(table.op('MATCH')(expression)).subquery()
+
+
+event_search = EventSearch()
@@ -0,0 +1,174 @@
+import heapq
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+from types import SimpleNamespace
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Event, EventSeries
+
+OCCURRENCE_FORMAT = '%Y-%m-%dT%H:%M'
+
+
+class Occurrence:
+    """An occurrence of a series that nobody has signed up for yet, so it has no Event row.
+    
+    Offers the parts of the Event interface that listings and the detail page use.
+    """
+    
+    id = None
+    signup_count = 0
+    volunteers = ()
+    
+    def __init__(self, series, date):
+        self.series = series
+        self.series_id = series.id
+        self.date = date
+        for name in ('title', 'description', 'address', 'city', 'state', 'zip_code', 'max_volunteers',
+                     'organizer', 'organizer_id', 'created_at'):
+            setattr(self, name, getattr(series, name))
+    
+    @property
+    def key(self):
+        return self.date.strftime(OCCURRENCE_FORMAT)
+    
+    def get_full_address(self):
+        return f"{self.address}, {self.city}, {self.state} {self.zip_code}"
+    
+    def volunteers_count(self):
+        return 0
+    
+    def spots_remaining(self):
+        return self.max_volunteers
+    
+    def can_edit(self, user):
+        return False
+    
+    def can_delete(self, user):
+        return False
+    
+    def api_row(self, fields):
+        row = SimpleNamespace(**{name: getattr(self, name) for name in (
+            'id', 'title', 'description', 'date', 'address', 'city', 'state', 'zip_code', 'max_volunteers',
+            'signup_count', 'series_id')}, organizer=self.organizer.username)
+        # Occurrences have no id yet; series_id and the key address them, e.g. for signups
+        return dict(Event.api_row(row, fields), series_id=self.series_id, occurrence=self.key)
+
+
+def series_window(start, end=None):
+    """Clamp a listing window so open-ended listings only expand series up to SERIES_HORIZON_DAYS ahead"""
+    horizon = start + timedelta(days=current_app.config.get('SERIES_HORIZON_DAYS', 60))
+    return start, min(end, horizon) if end else horizon
+
+
+def sort_key(item):
+    """Listing order: date, then stored events before occurrences, then id"""
+    if isinstance(item, Occurrence):
+        return item.date, 1, item.series_id
+    return item.date, 0, item.id
+
+
+def occurrences_between(start, end, after=None, criteria=()):
+    """Lazily yield unmaterialized occurrences in [start, end) in listing order.
+    
+    Only occurrence dates inside the window are generated, so the cost follows the window
+    rather than how long a series runs. `after` is a sort_key to resume from.
+    """
+    series = EventSeries.active_between(start, end).filter(*criteria).all()
+    if not series:
+        return
+    materialized = set(db.session.execute(
+        db.select(Event.series_id, Event.date).where(
+            Event.series_id.in_([each.id for each in series]), Event.date >= start, Event.date < end
+        )
+    ).all())
+    
+    # partial binds each series now; a nested generator expression would see only the last one
+    streams = [map(partial(Occurrence, each), each.occurrence_dates(start, end)) for each in series]
+    for occurrence in heapq.merge(*streams, key=sort_key):
+        if (occurrence.series_id, occurrence.date) in materialized or (after is not None and sort_key(occurrence) <= after):
+            continue
+        yield occurrence
+
+
+def count_occurrences(start, end, criteria=()):
+    """Unmaterialized occurrences in [start, end), counted arithmetically"""
+    series = EventSeries.active_between(start, end).filter(*criteria).all()
+    if not series:
+        return 0
+    materialized = db.session.execute(
+        db.select(db.func.count(Event.id)).where(
+            Event.series_id.in_([each.id for each in series]), Event.date >= start, Event.date < end
+        )
+    ).scalar()
+    return sum(each.count_between(start, end) for each in series) - materialized
+
+
+class ListingPagination(Pagination):
+    """Stored events merged by date with series occurrences, paged like Query.paginate.
+    
+    Takes query (upcoming events), start and end (the series window) and optional series criteria.
+    """
+    
+    def _query_items(self):
+        args = self._query_args
+        offset = (self.page - 1) * self.per_page
+        events = args['query'].order_by(Event.date.asc(), Event.id.asc()).limit(offset + self.per_page)
+        occurrences = occurrences_between(args['start'], args['end'], criteria=args.get('criteria', ()))
+        return list(islice(heapq.merge(events, occurrences, key=sort_key), offset, offset + self.per_page))
+    
+    def _query_count(self):
+        args = self._query_args
+        return args['query'].order_by(None).count() + count_occurrences(
+            args['start'], args['end'], criteria=args.get('criteria', ())
+        )
+
+
+def parse_occurrence(series, occurrence):
+    """The datetime of an occurrence key, or None if the series does not occur then"""
+    try:
+        date = datetime.strptime(occurrence, OCCURRENCE_FORMAT)
+    except ValueError:
+        return None
+    return date if series.is_occurrence(date) else None
+
+
+def materialize(series, date):
+    """The Event row for an occurrence, created on first use; the caller commits"""
+    event = Event.query.filter_by(series_id=series.id, date=date).first()
+    if event is not None:
+        return event
+    
+    event = Event(series_id=series.id, date=date, organizer_id=series.organizer_id,
+                  **{name: getattr(series, name) for name in ('title', 'description', 'address', 'city',
+                                                              'state', 'zip_code', 'max_volunteers')})
+    try:
+        # A savepoint, so losing the race only undoes this insert and not the caller's transaction
+        with db.session.begin_nested():
+            db.session.add(event)
+    except IntegrityError:
+        # Another request stored the same occurrence first
+        event = Event.query.filter_by(series_id=series.id, date=date).one()
+    return event
+
+
+def end_series(series, now=None):
+    """Stop a series from now on, or delete it if it has not started; the caller commits.
+    
+    Occurrences that already have signups are kept as standalone events. Returns how many were kept.
+    """
+    now = now or datetime.utcnow()
+    criteria = [Event.series_id == series.id]
+    if series.starts_at < now:
+        criteria.append(Event.date >= now)
+    kept = db.session.execute(
+        db.update(Event).where(*criteria).values(series_id=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if series.starts_at < now:
+        series.until = now if series.until is None else min(series.until, now)
+    else:
+        db.session.delete(series)
+    return kept
@@ -0,0 +1,98 @@
+from collections import Counter
+from app import db
+from app.models import Event, EventVolunteer, User
+
+
+class CapacityChanged(Exception):
+    """Another transaction took spots between the capacity check and the update"""
+
+
+def _counter_case(deltas):
+    return db.case(deltas, value=Event.id, else_=0)
+
+
+def batch_signup(event_ids, volunteer_ids):
+    """Sign every volunteer up for every event in one transaction.
+    
+    Returns one result per (event_id, volunteer_id) pair; the caller commits.
+    """
+    pairs = [(event_id, volunteer_id) for event_id in event_ids for volunteer_id in volunteer_ids]
+    
+    # Lock the event rows so the capacity read below stays valid until commit (Postgres)
+    events = {
+        row.id: row for row in db.session.execute(
+            db.select(Event.id, Event.signup_count, Event.max_volunteers)
+            .where(Event.id.in_(event_ids))
+            .with_for_update()
+        )
+    }
+    existing = set(db.session.execute(
+        db.select(EventVolunteer.event_id, EventVolunteer.volunteer_id)
+        .where(EventVolunteer.event_id.in_(event_ids), EventVolunteer.volunteer_id.in_(volunteer_ids))
+    ).all())
+    
+    remaining = {event_id: row.max_volunteers - row.signup_count for event_id, row in events.items()}
+    results = []
+    inserts = []
+    for event_id, volunteer_id in pairs:
+        if event_id not in events:
+            status = 'not_found'
+        elif (event_id, volunteer_id) in existing:
+            status = 'already_signed_up'
+        elif remaining[event_id] <= 0:
+            status = 'full'
+        else:
+            status = 'signed_up'
+            remaining[event_id] -= 1
+            existing.add((event_id, volunteer_id))
+            inserts.append({'event_id': event_id, 'volunteer_id': volunteer_id})
+        results.append({'event_id': event_id, 'volunteer_id': volunteer_id, 'status': status})
+    
+    if inserts:
+        deltas = Counter(row['event_id'] for row in inserts)
+        increment = _counter_case(deltas)
+        updated = db.session.execute(
+            db.update(Event)
+            .where(Event.id.in_(deltas), Event.signup_count + increment <= Event.max_volunteers)
+            .values(signup_count=Event.signup_count + increment)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated != len(deltas):
+            raise CapacityChanged()
+        db.session.execute(db.insert(EventVolunteer), inserts)
+    return results
+
+
+def batch_cancel(event_ids, volunteer_ids):
+    """Cancel every (event, volunteer) signup in one transaction; the caller commits"""
+    # Count only the rows this DELETE removed, so concurrent cancels of one signup decrement once
+    removed = set(db.session.execute(
+        db.delete(EventVolunteer)
+        .where(EventVolunteer.event_id.in_(event_ids), EventVolunteer.volunteer_id.in_(volunteer_ids))
+        .returning(EventVolunteer.event_id, EventVolunteer.volunteer_id)
+        .execution_options(synchronize_session=False)
+    ).all())
+    
+    results = [
+        {'event_id': event_id, 'volunteer_id': volunteer_id,
+         'status': 'canceled' if (event_id, volunteer_id) in removed else 'not_signed_up'}
+        for event_id in event_ids for volunteer_id in volunteer_ids
+    ]
+    
+    if removed:
+        deltas = Counter(event_id for event_id, _ in removed)
+        decrement = _counter_case(deltas)
+        db.session.execute(
+            db.update(Event)
+            .where(Event.id.in_(deltas), Event.signup_count > 0)
+            .values(signup_count=db.case((Event.signup_count > decrement, Event.signup_count - decrement), else_=0))
+            .execution_options(synchronize_session=False)
+        )
+    return results
+
+
+def volunteer_ids_exist(volunteer_ids):
+    found = db.session.execute(
+        db.select(db.func.count(User.id)).where(User.id.in_(volunteer_ids), User.user_type == 'volunteer')
+    ).scalar()
+    return found == len(set(volunteer_ids))
@@ -108,4 +108,48 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize countdowns
     updateEventCountdowns();
     setInterval(updateEventCountdowns, 60000); // Update every minute
+
+    // Live capacity updates pushed by the server
+    function showCapacity(data) {
+        document.querySelectorAll(`[data-live-event="${data.event_id}"]`).forEach(card => {
+            card.querySelectorAll('.live-signup-count').forEach(el => el.textContent = data.volunteers_count);
+            card.querySelectorAll('.live-max-volunteers').forEach(el => el.textContent = data.max_volunteers);
+            card.querySelectorAll('.live-spots-remaining').forEach(el => el.textContent = data.spots_remaining);
+        });
+    }
+    
+    // Used when the stream is refused (e.g. 503 at the connection cap), which EventSource never retries
+    function pollCapacity(ids) {
+        setInterval(function() {
+            fetch(`/api/events/capacity?ids=${ids.join(',')}`)
+                .then(response => response.ok ? response.json() : [])
+                .then(rows => rows.forEach(showCapacity))
+                .catch(() => {});
+        }, 30000);
+    }
+    
+    function subscribeToCapacity() {
+        const cards = document.querySelectorAll('[data-live-event]');
+        if (!cards.length) {
+            return;
+        }
+        
+        const ids = [...new Set([...cards].map(card => card.getAttribute('data-live-event')))];
+        if (!window.EventSource) {
+            pollCapacity(ids);
+            return;
+        }
+        const source = new EventSource(`/api/events/stream?ids=${ids.join(',')}`);
+        
+        source.addEventListener('capacity', function(message) {
+            showCapacity(JSON.parse(message.data));
+        });
+        source.addEventListener('error', function() {
+            if (source.readyState === EventSource.CLOSED) {
+                pollCapacity(ids);
+            }
+        });
+    }
+    
+    subscribeToCapacity();
 });
\ No newline at end of file
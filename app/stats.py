@@ -0,0 +1,102 @@
+import threading
+import time
+from sqlalchemy import event as sa_event, inspect
+from app import db
+from app.models import User, Event
+
+EVENTS_KEY = '__events__'
+ADMINS_KEY = '__admins__'
+
+
+class AdminStats:
+    """Admin dashboard counts from one grouped query, cached and kept current from ORM events"""
+    
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._counts = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.ttl = app.config.get('ADMIN_STATS_TTL', self.ttl)
+    
+    def get(self):
+        with self._lock:
+            if self._counts is not None and time.monotonic() < self._expires_at:
+                return self._summary(self._counts)
+        
+        counts = self._load()
+        with self._lock:
+            self._counts = counts
+            self._expires_at = time.monotonic() + self.ttl
+            return self._summary(counts)
+    
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+    
+    def adjust(self, key, delta):
+        with self._lock:
+            if self._counts is not None:
+                self._counts[key] = self._counts.get(key, 0) + delta
+    
+    @staticmethod
+    def _load():
+        admins = db.func.sum(db.case((User.is_admin.is_(True), 1), else_=0))
+        users_by_type = db.select(User.user_type, db.func.count(User.id), admins).group_by(User.user_type)
+        events_total = db.select(db.literal(EVENTS_KEY), db.func.count(Event.id), db.literal(0))
+        rows = db.session.execute(users_by_type.union_all(events_total)).all()
+        counts = {key: count for key, count, _ in rows}
+        counts[ADMINS_KEY] = sum(admin_count or 0 for _, _, admin_count in rows)
+        return counts
+    
+    @staticmethod
+    def _summary(counts):
+        return {
+            'total_users': sum(count for key, count in counts.items() if key not in (EVENTS_KEY, ADMINS_KEY)),
+            'total_events': counts.get(EVENTS_KEY, 0),
+            'total_admins': counts.get(ADMINS_KEY, 0),
+            'total_volunteers': counts.get('volunteer', 0),
+            'total_organizations': counts.get('organization', 0),
+        }
+
+
+admin_stats = AdminStats()
+
+
+@sa_event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    admin_stats.adjust(target.user_type, 1)
+    if target.is_admin:
+        admin_stats.adjust(ADMINS_KEY, 1)
+
+
+@sa_event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    history = inspect(target).attrs.is_admin.history
+    if history.has_changes():
+        admin_stats.adjust(ADMINS_KEY, 1 if target.is_admin else -1)
+
+
+@sa_event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    admin_stats.adjust(target.user_type, -1)
+    if target.is_admin:
+        admin_stats.adjust(ADMINS_KEY, -1)
+
+
+@sa_event.listens_for(Event, 'after_insert')
+def _event_inserted(mapper, connection, target):
+    admin_stats.adjust(EVENTS_KEY, 1)
+
+
+@sa_event.listens_for(Event, 'after_delete')
+def _event_deleted(mapper, connection, target):
+    admin_stats.adjust(EVENTS_KEY, -1)
+
+
+@sa_event.listens_for(db.session, 'after_bulk_delete')
+def _bulk_deleted(delete_context):
+    # Query.delete() bypasses per-row events, so recount on next read
+    if delete_context.mapper.class_ in (User, Event):
+        admin_stats.invalidate()
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from app import db
+from app.page_cache import page_cache
+
+
+class UserSnapshot(UserMixin):
+    """Immutable copy of the user fields views read on every request"""
+    
+    __slots__ = ('id', 'username', 'user_type', 'is_admin')
+    
+    def __init__(self, user):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(user, name))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot is read-only; load the User model to change it')
+    
+    def __getattr__(self, name):
+        # Anything beyond the snapshot (email, password checks, ...) comes from the database
+        if name.startswith('__'):
+            raise AttributeError(name)
+        from app.models import User
+        user = db.session.get(User, self.id)
+        if user is None:
+            # Deleted since the snapshot was taken; the next request's load_user logs them out
+            user_cache.invalidate(self.id)
+            raise AttributeError(f'user {self.id} no longer exists')
+        return getattr(user, name)
+    
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+class UserCache:
+    """Bounded LRU of user snapshots with a TTL, shared across requests in a worker.
+    
+    Only used when the page cache backend is shared between workers (PAGE_CACHE_BACKEND=redis):
+    each user has a version counter there, so a change made in one worker reaches the others on
+    their next request. Otherwise every request loads the user from the database.
+    """
+    
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _version_key(user_id):
+        return f'user:version:{user_id}'
+    
+    def _version(self, user_id):
+        return page_cache.backend.get_many([self._version_key(user_id)])[0]
+    
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+    
+    def get(self, user_id):
+        from app.models import User
+        
+        if not page_cache.backend.shared:
+            # A per-worker cache would keep serving demoted admins and deleted users from other workers
+            user = db.session.get(User, user_id)
+            return UserSnapshot(user) if user is not None else None
+        
+        now = time.monotonic()
+        version = self._version(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now < entry[1] and entry[2] == version:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+        
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        
+        snapshot = UserSnapshot(user)
+        with self._lock:
+            self._entries[user_id] = (snapshot, now + self.ttl, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return snapshot
+    
+    def invalidate(self, user_id):
+        """Call after a user's snapshot fields change or the user is deleted"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if page_cache.backend.shared:
+            page_cache.backend.incr(self._version_key(user_id))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+import requests
+
+
+def fetch_weather(city, url_template, timeout):
+    """Fetch current conditions for a city; returns None on any upstream failure"""
+    try:
+        response = requests.get(url_template.format(city=quote(city)), timeout=timeout)
+        if response.status_code == 200:
+            data = response.json()
+            current_condition = data['current_condition'][0]
+            return {
+                'temp': current_condition['temp_C'],
+                'desc': current_condition['weatherDesc'][0]['value'],
+                'humidity': current_condition['humidity']
+            }
+    except Exception:
+        pass
+    return None
+
+
+class WeatherCache:
+    """LRU cache of forecasts with TTL, stale-while-revalidate and deduplicated fetches"""
+    
+    def __init__(self, fetch=fetch_weather, url_template='http://wttr.in/{city}?format=j1', timeout=2.0,
+                 ttl=600, stale_ttl=3600, negative_ttl=60, max_size=512):
+        self.fetch = fetch
+        self.url_template = url_template
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def normalize(city):
+        return ' '.join((city or '').split()).lower()
+    
+    def get(self, city):
+        key = self.normalize(city)
+        if not key:
+            return None
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                value, fresh_until, stale_until = entry
+                if now < fresh_until:
+                    return value
+                if now < stale_until:
+                    self._start_fetch(key)
+                    return value
+            done = self._start_fetch(key)
+        
+        # Only misses wait, and never longer than the hard timeout
+        done.wait(self.timeout)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _start_fetch(self, key):
+        # Caller holds the lock; concurrent requests for a city share one fetch
+        done = self._inflight.get(key)
+        if done is None:
+            done = threading.Event()
+            self._inflight[key] = done
+            threading.Thread(
+                target=self._refresh,
+                args=(key, done),
+                daemon=True
+            ).start()
+        return done
+    
+    def _refresh(self, key, done):
+        try:
+            value = self.fetch(key, self.url_template, self.timeout)
+        except Exception:
+            value = None
+        
+        now = time.monotonic()
+        with self._lock:
+            if value is None:
+                previous = self._entries.get(key)
+                if previous is not None and previous[0] is not None and now < previous[2]:
+                    # Keep serving the stale forecast, but retry no sooner than negative_ttl
+                    self._entries[key] = (previous[0], now + self.negative_ttl, previous[2])
+                else:
+                    self._entries[key] = (None, now + self.negative_ttl, now + self.negative_ttl)
+            else:
+                self._entries[key] = (value, now + self.ttl, now + self.ttl + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        done.set()
+
+
+weather_cache = WeatherCache()
+
+
+def configure_weather_cache(app):
+    weather_cache.url_template = app.config.get('WEATHER_API_URL', weather_cache.url_template)
+    weather_cache.timeout = app.config.get('WEATHER_TIMEOUT', weather_cache.timeout)
+    weather_cache.ttl = app.config.get('WEATHER_CACHE_TTL', weather_cache.ttl)
+    weather_cache.stale_ttl = app.config.get('WEATHER_CACHE_STALE_TTL', weather_cache.stale_ttl)
+    weather_cache.negative_ttl = app.config.get('WEATHER_CACHE_NEGATIVE_TTL', weather_cache.negative_ttl)
+    weather_cache.max_size = app.config.get('WEATHER_CACHE_SIZE', weather_cache.max_size)
+
+
+def get_weather_forecast(city):
+    return weather_cache.get(city)
@@ -48,7 +48,68 @@ class Config:
     SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
     SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
     FROM_EMAIL = os.environ.get('FROM_EMAIL', SMTP_USERNAME)
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+    
+    # Outbound mail queue
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 20))
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES', 3))
+    MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF', 1.0))
+    MAIL_IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT', 30.0))
+    
+    # `flask send-reminders` emails volunteers about events starting within this many hours
+    REMINDER_WINDOW_HOURS = float(os.environ.get('REMINDER_WINDOW_HOURS', 24))
+    # Claims older than this belong to a run that died and are retried
+    REMINDER_CLAIM_TIMEOUT_MINUTES = float(os.environ.get('REMINDER_CLAIM_TIMEOUT_MINUTES', 30))
+    
+    # Password hashing
+    PASSWORD_HASH_BACKEND = os.environ.get('PASSWORD_HASH_BACKEND', 'werkzeug')
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2')
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS', 0))
+    PASSWORD_VERIFY_TIMEOUT = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', 10.0))
+    
+    # Logged-in user cache; only active with PAGE_CACHE_BACKEND=redis, which carries its invalidations
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    
+    # Chatbot intent table (defaults to app/data/chatbot_intents.json)
+    CHATBOT_INTENTS_PATH = os.environ.get('CHATBOT_INTENTS_PATH')
+    
+    # ZIP centroids for proximity search, built by `flask import-zip-centroids` (defaults to app/data/zip_centroids.csv)
+    ZIP_CENTROIDS_PATH = os.environ.get('ZIP_CENTROIDS_PATH')
+    
+    # How far ahead open-ended listings expand recurring series
+    SERIES_HORIZON_DAYS = int(os.environ.get('SERIES_HORIZON_DAYS', 60))
+    
+    # Anonymous page cache: 'memory' (per worker), 'redis' (shared, needs redis) or 'none'
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_URL = os.environ.get('PAGE_CACHE_URL', 'redis://localhost:6379/0')
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 1024))
+    # Calendar feed bodies are keyed on their data version, so they can live much longer than pages
+    FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 86400))
+    
+    # Live capacity streams (SSE), per worker process. Each open stream holds a gunicorn thread, so keep
+    # this below --threads (the Dockerfile runs gthread workers with 64 threads and sets 48)
+    LIVE_MAX_CONNECTIONS = int(os.environ.get('LIVE_MAX_CONNECTIONS', 1000))
+    LIVE_MAX_PENDING = int(os.environ.get('LIVE_MAX_PENDING', 20))
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 2.0))
+    LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15.0))
+    
+    # Idempotency-Key records for POST retries
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_PURGE_EVERY = int(os.environ.get('IDEMPOTENCY_PURGE_EVERY', 100))
+    
+    # Admin dashboard
+    ADMIN_STATS_TTL = int(os.environ.get('ADMIN_STATS_TTL', 30))
     
     # API keys
     WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', 'demo-weather-key')
-    MAPS_API_KEY = os.environ.get('MAPS_API_KEY', 'demo-maps-key')
\ No newline at end of file
+    MAPS_API_KEY = os.environ.get('MAPS_API_KEY', 'demo-maps-key')
+    
+    # Weather cache
+    WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'http://wttr.in/{city}?format=j1')
+    WEATHER_TIMEOUT = float(os.environ.get('WEATHER_TIMEOUT', 2.0))
+    WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 600))
+    WEATHER_CACHE_STALE_TTL = int(os.environ.get('WEATHER_CACHE_STALE_TTL', 3600))
+    WEATHER_CACHE_NEGATIVE_TTL = int(os.environ.get('WEATHER_CACHE_NEGATIVE_TTL', 60))
+    WEATHER_CACHE_SIZE = int(os.environ.get('WEATHER_CACHE_SIZE', 512))
\ No newline at end of file